@@ -0,0 +1,109 @@
+"""
+Benchmark of the .argos file generation of a large arena, with the streaming XmlWriter and with the previous method
+(building an ElementTree, serializing it, then parsing it again with minidom to pretty print it). The time, peak memory
+and output of both methods are compared.
+
+Usage : python -m benchmarks.argosGeneration [obstacles] [lights]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from xml.dom import minidom
+import xml.etree.ElementTree as ET
+
+from src.models.argos import XmlWriter, writeArgosFile
+from src.models.mission import loadMission
+from src.models.objectiveUtils.costEstimator import formatMemory
+
+
+class ElementTreeWriter:
+    """
+    Same interface as XmlWriter, building an ElementTree written with minidom's toprettyxml when closed, as the .argos
+    files were generated before.
+    """
+    def __init__(self, file, indent="  "):
+        self.file = file
+        self.indent = indent
+        self.root = None
+        self.elements = []
+
+    def startElement(self, tag, attrib=None, **extra):
+        if self.elements:
+            element = ET.SubElement(self.elements[-1], tag, attrib or {}, **extra)
+        else:
+            element = self.root = ET.Element(tag, attrib or {}, **extra)
+        self.elements.append(element)
+
+    def endElement(self, tail=None):
+        element = self.elements.pop()
+        if tail is not None:
+            element.tail = (element.tail or "") + tail
+
+    def addElement(self, tag, attrib=None, **extra):
+        self.startElement(tag, attrib, **extra)
+        self.endElement()
+
+    def addComment(self, comment):
+        self.elements[-1].append(ET.Comment(comment))
+
+    def addText(self, text):
+        parent = self.elements[-1]
+        if len(parent):
+            parent[-1].tail = (parent[-1].tail or "") + text
+        else:
+            parent.text = (parent.text or "") + text
+
+    def close(self):
+        self.elements.clear()
+        dom = minidom.parseString(ET.tostring(self.root))
+        self.file.write(dom.toprettyxml(indent=self.indent))
+
+
+def createMission(obstacles, lights):
+    mission = loadMission("test.json")
+    mission.arena.loadFromData({
+        "shape": "Dodecagon",
+        "obstacles": [{"x": i % 200 - 100, "y": i // 200, "width": 5, "height": 10, "orientation": i % 90}
+                      for i in range(obstacles)],
+        "lights": [{"x": -i, "y": i, "strength": i % 30} for i in range(lights)],
+    })
+    return mission
+
+
+def measure(mission, writerClass, path):
+    """
+    Time and peak memory of the generation in the file (measured in two runs, as tracing the memory slows it down).
+    """
+    with open(path, 'w') as file:
+        start = time.perf_counter()
+        writeArgosFile(mission, writerClass(file), source="benchmark")
+        duration = time.perf_counter() - start
+
+    tracemalloc.start()
+    with open(path, 'w') as file:
+        writeArgosFile(mission, writerClass(file), source="benchmark")
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    with open(path) as file:
+        return file.read(), duration, peak
+
+
+def main(obstacles=5000, lights=500):
+    mission = createMission(obstacles, lights)
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "benchmark.argos")
+        treeOutput, treeTime, treePeak = measure(mission, ElementTreeWriter, path)
+        streamOutput, streamTime, streamPeak = measure(mission, XmlWriter, path)
+
+    print(f".argos generation of an arena with {obstacles} obstacles and {lights} lights ({len(streamOutput) / 1e6:.1f} MB)")
+    print(f"  ElementTree + minidom : {treeTime * 1000:8.1f} ms, peak memory {formatMemory(treePeak)}")
+    print(f"  streaming writer      : {streamTime * 1000:8.1f} ms, peak memory {formatMemory(streamPeak)}"
+          f"  (x{treeTime / streamTime:.1f} faster)")
+    print(f"  identical output      : {treeOutput == streamOutput}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
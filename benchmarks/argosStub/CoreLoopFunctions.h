@@ -0,0 +1,41 @@
+/*
+ * Stub of the CoreLoopFunctions base class of the experiments loop functions, with the members used by the generated
+ * loop functions. REGISTER_LOOP_FUNCTIONS defines the factory used by the harness driver.
+ */
+#ifndef CORE_LOOP_FUNCTIONS
+#define CORE_LOOP_FUNCTIONS
+
+#include <argos3/core/simulator/space/space.h>
+
+using namespace argos;
+
+class CoreLoopFunctions {
+  public:
+    CoreLoopFunctions(): m_pcRng(&m_cRng), m_fDistributionRadius(0), m_unNumberRobots(0) {}
+    virtual ~CoreLoopFunctions() {}
+
+    virtual void Init(TConfigurationNode& t_tree) {
+      m_unNumberRobots = GetSpace().GetEntitiesByType("epuck").size();
+    }
+    virtual void Reset() {}
+    virtual void Destroy() {}
+    virtual void PostStep() {}
+    virtual void PostExperiment() {}
+
+    virtual Real GetObjectiveFunction() = 0;
+    virtual CVector3 GetRandomPosition() = 0;
+
+    CSpace& GetSpace() { return CSpace::GetInstance(); }
+
+  protected:
+    CRandom::CRNG* m_pcRng;
+    Real m_fDistributionRadius;
+    UInt32 m_unNumberRobots;
+
+  private:
+    CRandom::CRNG m_cRng;
+};
+
+#define REGISTER_LOOP_FUNCTIONS(CLASS, LABEL) CoreLoopFunctions* CreateLoopFunctions() { return new CLASS(); }
+
+#endif
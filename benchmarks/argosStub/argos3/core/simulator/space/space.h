@@ -0,0 +1,171 @@
+/*
+ * Minimal stub of the ARGoS API used by the generated loop functions, to compile and run them without ARGoS
+ * (see benchmarks/loopFunctionsHarness.py). Only the members used by the objective model are defined.
+ */
+#ifndef ARGOS_STUB_SPACE_H
+#define ARGOS_STUB_SPACE_H
+
+#include <cmath>
+#include <cstdint>
+#include <iostream>
+#include <map>
+#include <random>
+#include <stdexcept>
+#include <string>
+
+#define LOG std::cerr
+
+namespace argos {
+
+  typedef double Real;
+  typedef int32_t SInt32;
+  typedef uint32_t UInt32;
+  typedef uint64_t UInt64;
+
+  struct TConfigurationNode {};
+
+  class CVector2 {
+    public:
+      CVector2(): m_fX(0), m_fY(0) {}
+      CVector2(Real x, Real y): m_fX(x), m_fY(y) {}
+
+      Real GetX() const { return m_fX; }
+      Real GetY() const { return m_fY; }
+      Real SquareLength() const { return m_fX * m_fX + m_fY * m_fY; }
+      Real Length() const { return std::sqrt(SquareLength()); }
+
+      CVector2& operator+=(const CVector2& other) { m_fX += other.m_fX; m_fY += other.m_fY; return *this; }
+      CVector2& operator-=(const CVector2& other) { m_fX -= other.m_fX; m_fY -= other.m_fY; return *this; }
+      CVector2& operator*=(Real value) { m_fX *= value; m_fY *= value; return *this; }
+      CVector2& operator/=(Real value) { m_fX /= value; m_fY /= value; return *this; }
+      CVector2 operator+(const CVector2& other) const { return CVector2(*this) += other; }
+      CVector2 operator-(const CVector2& other) const { return CVector2(*this) -= other; }
+      CVector2 operator*(Real value) const { return CVector2(*this) *= value; }
+      CVector2 operator/(Real value) const { return CVector2(*this) /= value; }
+      CVector2 operator-() const { return CVector2(-m_fX, -m_fY); }
+      bool operator==(const CVector2& other) const { return m_fX == other.m_fX && m_fY == other.m_fY; }
+
+    private:
+      Real m_fX;
+      Real m_fY;
+  };
+
+  class CVector3 {
+    public:
+      CVector3(): m_fX(0), m_fY(0), m_fZ(0) {}
+      CVector3(Real x, Real y, Real z): m_fX(x), m_fY(y), m_fZ(z) {}
+
+      Real GetX() const { return m_fX; }
+      Real GetY() const { return m_fY; }
+      Real GetZ() const { return m_fZ; }
+
+    private:
+      Real m_fX;
+      Real m_fY;
+      Real m_fZ;
+  };
+
+  class CRadians {
+    public:
+      explicit CRadians(Real value = 0): m_fValue(value) {}
+      Real GetValue() const { return m_fValue; }
+
+      static const CRadians PI;
+
+    private:
+      Real m_fValue;
+  };
+
+  template <typename T>
+  class CRange {
+    public:
+      CRange(T min, T max): m_tMin(min), m_tMax(max) {}
+      T GetMin() const { return m_tMin; }
+      T GetMax() const { return m_tMax; }
+
+    private:
+      T m_tMin;
+      T m_tMax;
+  };
+
+  class CRandom {
+    public:
+      class CRNG {
+        public:
+          CRNG(UInt32 seed = 0): m_cGenerator(seed) {}
+          Real Uniform(const CRange<Real>& range) {
+            return std::uniform_real_distribution<Real>(range.GetMin(), range.GetMax())(m_cGenerator);
+          }
+
+        private:
+          std::mt19937 m_cGenerator;
+      };
+  };
+
+  /* Entities are stored as pointers, and any_cast gives them back with their type */
+  struct CAny {
+    CAny(): Pointer(nullptr) {}
+    template <typename T> CAny(T* pointer): Pointer(pointer) {}
+    void* Pointer;
+  };
+
+  template <typename T>
+  T any_cast(const CAny& value) {
+    if (value.Pointer == nullptr)
+      throw std::runtime_error("any_cast of a missing entity");
+    return static_cast<T>(value.Pointer);
+  }
+
+  struct SAnchor {
+    CVector3 Position;
+  };
+
+  class CEmbodiedEntity {
+    public:
+      SAnchor& GetOriginAnchor() { return m_sOriginAnchor; }
+
+    private:
+      SAnchor m_sOriginAnchor;
+  };
+
+  class CEPuckEntity {
+    public:
+      CEmbodiedEntity& GetEmbodiedEntity() { return m_cEmbodiedEntity; }
+      void SetPosition(Real x, Real y) { m_cEmbodiedEntity.GetOriginAnchor().Position = CVector3(x, y, 0); }
+
+    private:
+      CEmbodiedEntity m_cEmbodiedEntity;
+  };
+
+  class CLightEntity {
+    public:
+      CLightEntity(Real x, Real y): m_cPosition(x, y, 0) {}
+      const CVector3& GetPosition() const { return m_cPosition; }
+
+    private:
+      CVector3 m_cPosition;
+  };
+
+  class CSpace {
+    public:
+      typedef std::map<std::string, CAny> TMapPerType;
+
+      static CSpace& GetInstance() {
+        static CSpace cSpace;
+        return cSpace;
+      }
+
+      TMapPerType& GetEntitiesByType(const std::string& type) { return m_mapEntities[type]; }
+      UInt32 GetSimulationClock() const { return m_unSimulationClock; }
+      void SetSimulationClock(UInt32 clock) { m_unSimulationClock = clock; }
+
+    private:
+      CSpace(): m_unSimulationClock(0) {}
+
+      std::map<std::string, TMapPerType> m_mapEntities;
+      UInt32 m_unSimulationClock;
+  };
+
+}
+
+#endif
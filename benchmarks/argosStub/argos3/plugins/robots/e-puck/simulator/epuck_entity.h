@@ -0,0 +1 @@
+#include <argos3/core/simulator/space/space.h>
@@ -0,0 +1,98 @@
+/*
+ * Driver of the generated loop functions, compiled with them against the ARGoS stub.
+ *
+ * Usage : harness positions.txt [seconds]
+ * The positions file starts with a "ticks robots lights" line, followed by a "name x y" line per light and a "x y"
+ * line per robot and tick. The loop functions are initialized with the positions of the first tick, then PostStep is
+ * called after the positions of each tick are set, and the final objective value is printed.
+ * With a duration, PostStep is instead called on the first positions for that many seconds, and the time per call is
+ * printed in ns.
+ */
+#include <chrono>
+#include <cstdio>
+#include <fstream>
+#include <memory>
+#include <vector>
+
+#include "src/CoreLoopFunctions.h"
+
+CoreLoopFunctions* CreateLoopFunctions();
+
+const CRadians CRadians::PI(3.14159265358979323846);
+
+static std::string EntityId(const std::string& prefix, size_t index) {
+  char id[32];
+  std::snprintf(id, sizeof(id), "%s_%06zu", prefix.c_str(), index);  // ids sorted as the robots
+  return id;
+}
+
+int main(int argc, char** argv) {
+  if (argc < 2) {
+    std::fprintf(stderr, "Usage : %s positions.txt [seconds]\n", argv[0]);
+    return 1;
+  }
+
+  std::ifstream input(argv[1]);
+  size_t ticks, robots, lights;
+  input >> ticks >> robots >> lights;
+
+  CSpace& space = CSpace::GetInstance();
+  std::vector<std::unique_ptr<CLightEntity>> lightEntities;
+  for (size_t i = 0; i < lights; i++) {
+    std::string name;
+    Real x, y;
+    input >> name >> x >> y;
+    lightEntities.emplace_back(new CLightEntity(x, y));
+    space.GetEntitiesByType("light")[name] = lightEntities.back().get();
+  }
+
+  std::vector<CEPuckEntity> epucks(robots);
+  for (size_t i = 0; i < robots; i++)
+    space.GetEntitiesByType("epuck")[EntityId("epuck", i)] = &epucks[i];
+
+  std::vector<Real> positions(ticks * robots * 2);
+  for (Real& coordinate: positions)
+    input >> coordinate;
+  if (!input) {
+    std::fprintf(stderr, "Invalid positions file %s\n", argv[1]);
+    return 1;
+  }
+
+  auto setPositions = [&](size_t tick) {
+    for (size_t i = 0; i < robots; i++)
+      epucks[i].SetPosition(positions[(tick * robots + i) * 2], positions[(tick * robots + i) * 2 + 1]);
+  };
+
+  std::unique_ptr<CoreLoopFunctions> loopFunctions(CreateLoopFunctions());
+  TConfigurationNode tree;
+  setPositions(0);
+  loopFunctions->Init(tree);
+
+  if (argc > 2) {
+    double duration = std::atof(argv[2]);
+    UInt64 calls = 0;
+    UInt64 batch = 1;
+    auto start = std::chrono::steady_clock::now();
+    std::chrono::duration<double> elapsed;
+    do {
+      for (UInt64 i = 0; i < batch; i++) {
+        space.SetSimulationClock(space.GetSimulationClock() + 1);
+        loopFunctions->PostStep();
+      }
+      calls += batch;
+      batch *= 2;
+      elapsed = std::chrono::steady_clock::now() - start;
+    } while (elapsed.count() < duration);
+    std::printf("%.1f\n", elapsed.count() * 1e9 / calls);
+    return 0;
+  }
+
+  for (size_t tick = 0; tick < ticks; tick++) {
+    setPositions(tick);
+    space.SetSimulationClock(tick + 1);
+    loopFunctions->PostStep();
+  }
+  loopFunctions->PostExperiment();
+  std::printf("%.17g\n", loopFunctions->GetObjectiveFunction());
+  return 0;
+}
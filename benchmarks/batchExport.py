@@ -0,0 +1,56 @@
+"""
+Benchmark of the loop functions generation of many missions, serially and in a process pool. The generated files of
+both runs are compared, to check that concurrent generations do not interfere.
+
+Usage : python -m benchmarks.batchExport [missions] [workers]
+"""
+import filecmp
+import os
+import sys
+import tempfile
+import time
+
+from src.models.mission import loadMission
+from src.models.objectiveUtils.stage import Stage
+from src.models.objectiveUtils.loopFunctions import generateLoopFunctions, generateLoopFunctionsBatch
+from src.models.objectiveUtils.stageParser import getStageParser
+
+
+def createMissions(count):
+    missions = []
+    for i in range(count):
+        mission = loadMission("test.json")
+        mission.objective.name = f"Mission{i}"
+        mission.objective.postStepStages.extend(
+            Stage({"name": f"stage{i}_{j}", "code": f"Sum(Dist(robotsPos, LightPos(\"light{j}\"))) * {i + j}"})
+            for j in range(i % 10)
+        )
+        missions.append(mission)
+    return missions
+
+
+def main(count=200, workers=None):
+    missions = createMissions(count)
+    getStageParser()
+
+    with tempfile.TemporaryDirectory() as serialFolder, tempfile.TemporaryDirectory() as batchFolder:
+        start = time.perf_counter()
+        for i, mission in enumerate(missions):
+            generateLoopFunctions(mission, os.path.join(serialFolder, f"mission{i}.cpp"))
+        serial = time.perf_counter() - start
+
+        start = time.perf_counter()
+        generateLoopFunctionsBatch(((mission, os.path.join(batchFolder, f"mission{i}.cpp")) for i, mission in enumerate(missions)), workers)
+        batch = time.perf_counter() - start
+
+        files = sorted(os.listdir(serialFolder))
+        _, mismatch, errors = filecmp.cmpfiles(serialFolder, batchFolder, files, shallow=False)
+
+    print(f"Loop functions generation of {count} missions")
+    print(f"  serial       : {serial * 1000:8.1f} ms")
+    print(f"  process pool : {batch * 1000:8.1f} ms ({workers or os.cpu_count()} workers)")
+    print(f"  identical    : {len(files) - len(mismatch) - len(errors)}/{len(files)} files")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,187 @@
+"""
+Differential test of the generated loop functions against the NumPy evaluator, without ARGoS : the loop functions are
+compiled with g++ against a stub of the ARGoS API (benchmarks/argosStub), run on random positions, and their objective
+value is compared with the value of evaluateObjective for the same positions. The bench mode reports the time per
+ComputeStepObjectiveValue call of the generated code, for 10 to 1000 robots.
+
+The objectives are a set of stages covering the functions of the objective model, or the objectives of the given
+mission files. The compiler can be set with the CXX environment variable.
+
+Usage : python -m benchmarks.loopFunctionsHarness [check|bench] [mission.json ...]
+"""
+import copy
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.models.arena import Arena
+from src.models.mission import loadMission
+from src.models.objective import Objective
+from src.models.objectiveUtils.loopFunctions import generateLoopFunctions
+from src.models.objectiveUtils.numpyEvaluator import evaluateObjective, getLightPositions
+
+stubFolder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "argosStub")
+compiler = os.environ.get("CXX", "g++")
+compilerFlags = ["-std=c++14", "-O2"]
+
+arena = Arena({"lights": [{"x": 240, "y": -120}, {"x": -384, "y": 288}]})  # lights at (0.5, -0.25) and (-0.8, 0.6)
+initStages = [  # the variables of the init stages are positions for the post step stages
+    {"name": "start", "code": 'LightPos("light_1")'},
+    {"name": "far", "code": 'Max(Dist(robotsPos, LightPos("light_0")))'},
+]
+postExpStages = [{"name": "final", "code": "objective / 10 + far", "increment": True}]
+stageCodes = [
+    'Sum(Dist(robotsPos, LightPos("light_0")))',
+    'Mean(Dist(LightPos("light_1"), robotsPos)) * 2 - 1',
+    'Min(Dist(robotsPos, ClosestNeighbors(robotsPos)))',
+    'Max(DistX(robotsPos, robotsPos)) / 3',
+    'Sum(DistX(robotsPos, ClosestNeighbors(robotsPos))) / (Count(robotsPos) + 1)',
+    'Variance(Dist(robotsPos, start))',
+    'ArgMin(Dist(robotsPos, LightPos("light_0")))',
+    'Count(Dist(robotsPos, robotsPos)) + Count(robotsPos)',
+    'Mean(Dist(robotsPos, ClosestNeighbors(robotsPos))) + Variance(DistX(ClosestNeighbors(robotsPos), robotsPos))',
+    'CountWithin(robotsPos, 0.3)',
+    'Sum(NeighborsWithin(robotsPos, 0.4)) + Max(NeighborsWithin(robotsPos, 0.2))',
+    'Dist(LightPos("light_0"), LightPos("light_1")) * far',
+    'ArgMin(DistX(robotsPos, ClosestNeighbors(robotsPos))) + Min(Dist(start, robotsPos))',
+    'Update(start, LightPos("light_0")) + Sum(Dist(robotsPos, start))',
+    'Update(robotsPos, ClosestNeighbors(robotsPos)) + Sum(Dist(robotsPos, start))',
+    'Update(objective, objective / 2 + 1) + objective',
+]
+# generation options, used in turn by the objectives
+generationOptions = [{}, {"parallel": True, "memberBuffers": True}, {"instrument": True}]
+checkRobots = (1, 2, 9, 150)
+checkTicks = 24
+benchRobots = (10, 30, 100, 300, 1000)
+benchDuration = 0.2
+
+
+def getObjectives(missionPaths):
+    """
+    (name, objective, arena) of the objectives to test : one per stage code of the model, or those of the missions.
+    """
+    if missionPaths:
+        for path in missionPaths:
+            mission = loadMission(path)
+            yield os.path.basename(path), mission.objective, mission.arena
+        return
+
+    for i, code in enumerate(stageCodes):
+        objective = Objective({
+            "name": f"Harness{i}",
+            "evaluationPeriod": 1 + 2 * (i % 2),
+            "rescaleEvaluation": i % 4 == 1,
+            "initStages": initStages,
+            "postStepStages": [{"name": "value", "code": code, "increment": True}],
+            "postExpStages": postExpStages,
+        })
+        yield code, objective, arena
+
+
+class LoopFunctionsBuild:
+    """
+    Loop functions of an objective compiled with the harness driver, in a subfolder of the given folder.
+    """
+    def __init__(self, folder, objective, arena, **options):
+        self.folder = folder
+        name = f"Build{len(os.listdir(folder))}"
+        buildFolder = os.path.join(folder, name)
+        codeFolder = os.path.join(buildFolder, "loop-functions", "objective")
+        os.makedirs(codeFolder)
+        os.makedirs(os.path.join(buildFolder, "src"))
+        shutil.copy(os.path.join(stubFolder, "CoreLoopFunctions.h"), os.path.join(buildFolder, "src"))
+
+        codePath = os.path.join(codeFolder, f"{objective.name}LoopFunc.cpp")
+        generateLoopFunctions(SimpleNamespace(objective=objective, arena=arena), codePath, **options)
+
+        self.executable = os.path.join(buildFolder, "harness")
+        flags = compilerFlags + (["-fopenmp"] if options.get("parallel") else [])
+        driver = os.path.join(stubFolder, "harness.cpp")
+        subprocess.run([compiler, *flags, "-I", stubFolder, "-I", buildFolder, "-o", self.executable, driver, codePath],
+                       check=True, capture_output=True, text=True)
+
+    def run(self, trajectory, lights, duration=None):
+        """
+        Objective value for the trajectory (T, N, 2), or the ns per PostStep call if a duration is given.
+        """
+        inputPath = os.path.join(self.folder, "positions.txt")
+        with open(inputPath, 'w') as file:
+            file.write(f"{trajectory.shape[0]} {trajectory.shape[1]} {len(lights)}\n")
+            file.writelines(f"{name} {x!r} {y!r}\n" for name, (x, y) in lights.items())
+            np.savetxt(file, trajectory.reshape(-1, 2), fmt="%.17g")
+        command = [self.executable, inputPath] + ([str(duration)] if duration is not None else [])
+        result = subprocess.run(command, check=True, capture_output=True, text=True)
+        return float(result.stdout.split()[-1])
+
+
+def check(missionPaths):
+    rng = np.random.default_rng(0)
+    failures = 0
+    count = 0
+    with tempfile.TemporaryDirectory() as folder:
+        for i, (name, objective, objectiveArena) in enumerate(getObjectives(missionPaths)):
+            options = generationOptions[i % len(generationOptions)]
+            lights = getLightPositions(objectiveArena)
+            try:
+                build = LoopFunctionsBuild(folder, objective, objectiveArena, **options)
+            except subprocess.CalledProcessError as e:
+                print(f"FAIL  {name} : compilation error\n{e.stderr}")
+                count += len(checkRobots)
+                failures += len(checkRobots)
+                continue
+
+            objectiveFailures = failures
+            for robots in checkRobots:
+                trajectory = rng.uniform(-1, 1, (checkTicks, robots, 2))
+                value, expected, error = math.nan, math.nan, None
+                try:
+                    expected = evaluateObjective(objective, trajectory, lights)
+                    value = build.run(trajectory, lights)
+                except subprocess.CalledProcessError as e:
+                    error = e.stderr.strip()
+                except Exception as e:  # the evaluator cannot evaluate the objective either
+                    error = f"{type(e).__name__} : {e}"
+                count += 1
+                if error is not None or not math.isclose(value, expected, rel_tol=1e-9, abs_tol=1e-9):
+                    failures += 1
+                    print(f"FAIL  {name} ({robots} robots, {options}) : {value} instead of {expected}"
+                          + (f"\n{error}" if error else ""))
+            if failures == objectiveFailures:
+                print(f"ok    {name}")
+
+    print(f"{count - failures}/{count} runs match the NumPy evaluator")
+    return failures == 0
+
+
+def bench(missionPaths):
+    rng = np.random.default_rng(0)
+    print("ns per ComputeStepObjectiveValue".ljust(64) + "".join(f"{f'N={robots}':>12}" for robots in benchRobots))
+    with tempfile.TemporaryDirectory() as folder:
+        for name, objective, objectiveArena in getObjectives(missionPaths):
+            objective = copy.deepcopy(objective)
+            objective.evaluationPeriod = 1  # PostStep then only adds the value of ComputeStepObjectiveValue
+            lights = getLightPositions(objectiveArena)
+            build = LoopFunctionsBuild(folder, objective, objectiveArena)
+            times = []
+            for robots in benchRobots:
+                trajectory = rng.uniform(-1, 1, (1, robots, 2)) * math.sqrt(robots / 10)  # same density of robots
+                times.append(build.run(trajectory, lights, benchDuration))
+            label = name if len(name) <= 62 else name[:59] + "..."
+            print(f"{label:<64}" + "".join(f"{time:12.1f}" for time in times))
+
+
+def main(mode="check", *missionPaths):
+    if mode == "bench":
+        bench(missionPaths)
+    elif not check(missionPaths):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
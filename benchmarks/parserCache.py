@@ -0,0 +1,41 @@
+"""
+Benchmark of the StageParser construction, with and without the parsing tables cache.
+
+Usage : python -m benchmarks.parserCache [repeat]
+"""
+import os
+import sys
+import tempfile
+import timeit
+
+from src.util import ResourceLoader
+from src.models.objectiveUtils.stageParser import StageParser
+
+
+def construct(**options):
+    return StageParser("objective_model.json", "objective_grammar.lark", **options)
+
+
+def clearCache():
+    for file in os.listdir(ResourceLoader.cache_folder):
+        if file.startswith(StageParser.cachePrefix):
+            os.remove(os.path.join(ResourceLoader.cache_folder, file))
+
+
+def main(repeat=20):
+    with tempfile.TemporaryDirectory() as cacheFolder:
+        ResourceLoader.cache_folder = cacheFolder
+
+        uncached = timeit.timeit(lambda: construct(useCache=False), number=repeat) / repeat
+        cold = timeit.timeit(lambda: (clearCache(), construct()), number=repeat) / repeat
+        construct()
+        warm = timeit.timeit(construct, number=repeat) / repeat
+
+    print(f"StageParser construction ({repeat} runs)")
+    print(f"  no cache    : {uncached * 1000:8.2f} ms")
+    print(f"  cold cache  : {cold * 1000:8.2f} ms")
+    print(f"  warm cache  : {warm * 1000:8.2f} ms  (x{uncached / warm:.1f})")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
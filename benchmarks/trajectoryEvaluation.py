@@ -0,0 +1,51 @@
+"""
+Benchmark of the evaluation of an objective over a recorded trajectory, tick by tick and batched over the ticks (at once
+and by chunks). The values of the three evaluations are compared.
+
+Usage : python -m benchmarks.trajectoryEvaluation [ticks] [robots] [chunkSize]
+"""
+import sys
+import time
+
+import numpy as np
+
+from src.models.objective import Objective
+from src.models.objectiveUtils.numpyEvaluator import evaluateObjective, evaluateTrajectory
+
+objectives = {
+    "linear": Objective({"postStepStages": [
+        {"name": "light", "code": 'Mean(Dist(robotsPos, LightPos("light_0")))', "increment": True},
+        {"name": "spread", "code": "Variance(Dist(robotsPos, LightPos(\"light_0\"))) * 0.5", "increment": True},
+    ]}),
+    "quadratic": Objective({"postStepStages": [
+        {"name": "closest", "code": "Min(Dist(robotsPos, ClosestNeighbors(robotsPos)))", "increment": True},
+    ]}),
+}
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    value = function(*args, **kwargs)
+    return value, time.perf_counter() - start
+
+
+def main(ticks=10000, robots=200, chunkSize=256):
+    trajectory = np.random.default_rng(0).random((ticks, robots, 2)) * 2 - 1
+    lights = {"light_0": (0.5, 0.5)}
+
+    print(f"Evaluation of {ticks} ticks of {robots} robots")
+    for name, objective in objectives.items():
+        perTick, perTickTime = timed(evaluateObjective, objective, trajectory, lights)
+        batched, batchedTime = timed(evaluateTrajectory, objective, trajectory, lights)
+        chunked, chunkedTime = timed(evaluateTrajectory, objective, trajectory, lights, chunkSize=chunkSize)
+        identical = np.isclose(perTick, batched) and np.isclose(perTick, chunked)
+
+        print(f"  {name} objective")
+        print(f"    tick by tick  : {perTickTime * 1000:8.1f} ms")
+        print(f"    batched       : {batchedTime * 1000:8.1f} ms  (x{perTickTime / batchedTime:.1f})")
+        print(f"    chunks of {chunkSize:<4}: {chunkedTime * 1000:8.1f} ms  (x{perTickTime / chunkedTime:.1f})")
+        print(f"    same values   : {identical}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
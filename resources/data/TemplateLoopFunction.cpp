@@ -45,7 +45,7 @@ void ${objective_name}LoopFunction::Reset() {
 /****************************************/
 
 void ${objective_name}LoopFunction::PostStep() {
-	m_ObjectiveFunction += ComputeStepObjectiveValue();
+	${post_step_function}
 }
 
 /****************************************/
@@ -61,7 +61,7 @@ Real ${objective_name}LoopFunction::ComputeStepObjectiveValue() {
 void ${objective_name}LoopFunction::PostExperiment() {
   ${post_experiment_function}
   LOG << "${objective_name}" << std::endl;
-  LOG << "Objective function result = " << m_ObjectiveFunction << std::endl;
+  LOG << "Objective function result = " << m_ObjectiveFunction << std::endl;${instrumentation_report}
 }
 
 /****************************************/
@@ -6,6 +6,12 @@ ${source_header}
 #include <string>
 #include <vector>
 #include <cmath>
+#include <algorithm>
+#include <limits>
+#include <chrono>
+#include <iomanip>
+
+${parallel_macros}
 
 #include "../../src/CoreLoopFunctions.h"
 #include <argos3/core/simulator/space/space.h>
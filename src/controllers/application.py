@@ -112,10 +112,12 @@ class ApplicationController(ApplicationViewListener):
             if self.currentSavePath:
                 options["source"] = basename(self.currentSavePath)
 
-            generateArgosFile(self.missionController.currentMission, filePath, **options)
-
-            displayInformation("Argos File Generation",
-                               "The generated file still needs to be completed by the user at places indicated by 'TO COMPLETE'")
+            if generateArgosFile(self.missionController.currentMission, filePath, **options):
+                displayInformation("Argos File Generation",
+                                   "The generated file still needs to be completed by the user at places indicated by 'TO COMPLETE'")
+            else:
+                displayInformation("Argos File Generation",
+                                   "The file is up to date with the mission, it has been left untouched.")
 
     def onGenerateFunctions(self):
         """
@@ -133,9 +135,12 @@ class ApplicationController(ApplicationViewListener):
                 options["source"] = basename(self.currentSavePath)
 
             try:
-                generateLoopFunctions(self.missionController.currentMission, filePath, **options)
-                displayInformation("Loop Functions Generation",
-                                   "Functions have been generated in a .h and .cpp file.")
+                if generateLoopFunctions(self.missionController.currentMission, filePath, **options):
+                    displayInformation("Loop Functions Generation",
+                                       "Functions have been generated in a .h and .cpp file.")
+                else:
+                    displayInformation("Loop Functions Generation",
+                                       "The files are up to date with the mission, they have been left untouched.")
             except (LarkError, KeyError):
                 displayError("Generation Error", "Failed to generate the loop functions files due to a parsing error. One of the stages is not valid.")
 
@@ -128,6 +128,7 @@ class MissionController:
         """
         Updates the objective editor to the new mission.
         """
+        self.objectiveController.setArena(self.currentMission.arena)
         self.objectiveController.setObjective(self.currentMission.objective)
 
     # --------------- Loading the application model (skills and behaviors) ---------------
@@ -1,6 +1,7 @@
 from src.controllers.objectiveStage.initStage import InitStageController
 from src.controllers.objectiveStage.postExp import PostExpStageController
 from src.controllers.objectiveStage.postStep import PostStepStageController
+from src.models.objectiveUtils.costEstimator import estimateObjectiveCost, formatCostReport
 from src.util import Event
 from src.views.objective import ObjectiveView
 
@@ -12,12 +13,14 @@ class ObjectiveController:
     def __init__(self, view: ObjectiveView):
         self.view = view
         self.objective = None
+        self.arena = None
 
         self.onSelected = Event()
         self.onGenerateClicked = Event()
 
         self.postStepController = PostStepStageController(view.postStepView)
         self.postStepController.onIncrementChanged += self.updatePostStepFunction
+        self.postStepController.onCodeChanged += self.updatePostStepCost
         self.postExpController = PostExpStageController(view.postExpView)
         self.postExpController.onIncrementChanged += self.updatePostExpFunction
         self.initController = InitStageController(view.initView)
@@ -43,12 +46,26 @@ class ObjectiveController:
         """
         if self.objective is not None:
             self.objective.loadFromData(kwargs)
+            if "evaluationPeriod" in kwargs:
+                self.updatePostStepCost()
 
     def updatePostStepFunction(self):
         """
         Called when a stage has been add/removed. Updates the post step function expression.
         """
         self.view.updatePostStepFunction(self.objective.postStepStages)
+        self.updatePostStepCost()
+
+    def updatePostStepCost(self):
+        """
+        Called when the post step stages have been modified. Updates the estimated cost of the stages for the number of
+        robots of the arena.
+        """
+        if self.objective is None or self.arena is None:
+            return
+        robotNumber = self.arena.robotNumber
+        costs = estimateObjectiveCost(self.objective, robotNumber)
+        self.view.updatePostStepCost(formatCostReport(costs, robotNumber, self.objective.evaluationPeriod))
 
     def updatePostExpFunction(self):
         """
@@ -59,7 +76,8 @@ class ObjectiveController:
     # ------------------------------
 
     def setSelected(self, selected):
-        pass
+        if selected:  # the number of robots may have changed
+            self.updatePostStepCost()
 
     def setObjective(self, objective):
         """
@@ -72,6 +90,13 @@ class ObjectiveController:
             self.postExpController.setStageList(objective.postExpStages)
             self.initController.setStageList(objective.initStages)
             self.view.updateView(objective)
+            self.updatePostStepCost()
+
+    def setArena(self, arena):
+        """
+        Sets the arena of the mission, whose number of robots is used to estimate the cost of the objective.
+        """
+        self.arena = arena
 
     def setFunctionGenerator(self, functionGenerator):
         """
@@ -9,12 +9,15 @@ class PostStepStageController(StageController):
     def __init__(self, view):
         super().__init__(view)
         self.onIncrementChanged = Event()
+        self.onCodeChanged = Event()
 
     def onViewChanged(self, **kwargs):
         super(PostStepStageController, self).onViewChanged(**kwargs)
 
         if "increment" in kwargs:
             self.onIncrementChanged()
+        if "code" in kwargs:
+            self.onCodeChanged()
 
     # ---------- Events ------------
 
@@ -8,6 +8,7 @@ Swarm Skill Wizard
 Required Packages:
  - PyQt 5
  - Lakrk
+ - NumPy (for the evaluation of objectives without ARGoS)
 """
 
 import sys
@@ -2,7 +2,7 @@ from src.models.arenaObjects.floor import Floor
 from src.models.arenaObjects.light import Light
 from src.models.arenaObjects.obstacle import Obstacle
 from src.models.arenaObjects.spawn import ArenaSpawn
-from src.util import Shape
+from src.util import Shape, shape_scale_factor
 
 ArenaShape = [Shape(i) for i in range(1, 6)]
 
@@ -36,6 +36,12 @@ class Arena:
         if "lights" in data:
             self.lights = [Light(light) for light in data["lights"]]
 
+    def getCoordScale(self):
+        """
+        Scale from the arena units (of the objects positions and dimensions) to the meters of ARGoS.
+        """
+        return (self.sideLength * shape_scale_factor[self.shape]) / (240 * 100)
+
     def toJson(self):
         return {
             "shape": self.shape.name,
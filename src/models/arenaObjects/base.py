@@ -1,3 +1,7 @@
+import math
+
+import numpy as np
+
 from src.util import DataContainer, Shape
 
 ArenaObjectShape = [Shape.Circle, Shape.Rectangle]
@@ -15,6 +19,20 @@ class BaseArenaObject(DataContainer):
             "orientation": 0,
         }
 
+    def contains(self, x, y):
+        """
+        Whether the points of coordinates x and y (arrays, in the arena units) are inside the object, as it is drawn by
+        its view : a circle, or a rectangle centered on the object position and rotated by its orientation (in degrees).
+        """
+        dx = np.asarray(x) - self.x
+        dy = np.asarray(y) - self.y
+        if Shape[self.shape] == Shape.Rectangle:
+            angle = math.radians(self.orientation)
+            u = dx * math.cos(angle) + dy * math.sin(angle)
+            v = dy * math.cos(angle) - dx * math.sin(angle)
+            return (np.abs(u) <= self.width / 2) & (np.abs(v) <= self.height / 2)
+        return dx * dx + dy * dy <= self.radius * self.radius
+
 
 class MultiArenaObject(BaseArenaObject):
     def getAttributes(self):
@@ -2,98 +2,230 @@
 Argos File Generation utilities
 """
 
+import json
 import math
-from xml.dom import minidom
-import xml.etree.ElementTree as ET
+import os
 
+from src.models.floorImage import defaultResolution, exportFloorImage, getFloorImageName, \
+    getGeneratorHash as getFloorGeneratorHash
 from src.models.mission import Mission, Arena
-from src.util import Shape, shape_scale_factor
+from src.util import Shape, contentHash, moduleHash, readFingerprint
 from src.models.arenaObjects.light import Light
 
+_generatorHash = []  # hash of the generator sources, computed on first use by getArgosFileKey
+
+arenaSize = 10  # side (in m) of the square ARGoS arena, and of the floor image
+
+
+class XmlWriter:
+    """
+    Writes an indented XML document to a file as it is generated, element by element, instead of building the whole
+    tree first. The layout is the one of minidom's toprettyxml : one node per line, elements without children are
+    closed with "/>", and an element whose only child is a text is written on one line.
+
+    An element is opened by startElement and closed by endElement ; its start tag is only completed when its first
+    child (or its end) is written, so that empty elements do not need to be known in advance.
+    """
+    def __init__(self, file, indent="  "):
+        self.write = file.write
+        self.indent = indent
+        self.elements = []  # [tag, has children, pending text] of the open elements
+        self.write('<?xml version="1.0" ?>\n')
+
+    def startElement(self, tag, attrib=None, **extra):
+        self.addChild()
+        self.write(f"{self.indent * len(self.elements)}<{tag}")
+        for name, value in {**(attrib or {}), **extra}.items():
+            self.write(f' {name}="{escape(value)}"')
+        self.elements.append([tag, False, None])
+
+    def endElement(self, tail=None):
+        tag, hasChildren, text = self.elements.pop()
+        if text is not None and not hasChildren:  # only child
+            self.write(f">{escape(text)}</{tag}>\n")
+        elif hasChildren or text is not None:
+            if text is not None:
+                self.writeText(text, len(self.elements) + 1)
+            self.write(f"{self.indent * len(self.elements)}</{tag}>\n")
+        else:
+            self.write("/>\n")
+        if tail is not None:
+            self.addText(tail)
+
+    def addElement(self, tag, attrib=None, **extra):
+        """
+        Element without children.
+        """
+        self.startElement(tag, attrib, **extra)
+        self.endElement()
+
+    def addComment(self, comment):
+        self.addChild()
+        self.write(f"{self.indent * len(self.elements)}<!--{comment}-->\n")
+
+    def addText(self, text):
+        # kept until the next node, as a text alone in its element is written on the line of the element
+        element = self.elements[-1]
+        element[2] = text if element[2] is None else element[2] + text  # adjacent texts are one node
+
+    def addChild(self):
+        """
+        Completes the start tag of the current element (and writes its pending text) before a new child.
+        """
+        if not self.elements:
+            return
+        element = self.elements[-1]
+        if not element[1]:
+            self.write(">\n")
+            element[1] = True
+        if element[2] is not None:
+            self.writeText(element[2], len(self.elements))
+            element[2] = None
+
+    def writeText(self, text, depth):
+        self.write(f"{self.indent * depth}{escape(text)}\n")
+
+    def close(self):
+        while self.elements:
+            self.endElement()
+
+
+def escape(value):
+    return str(value).replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
+
 
 def generateArgosFile(mission: Mission, file_name, **options):
-    root = ET.Element("argos-configuration")
+    """
+    Writes the .argos file of the mission. The experiment can be set with the length (in s), randomSeed and robotNumber
+    options, the robots number being the one of the arena by default.
+
+    The floors are rasterized into an image written next to the file (see floorImage), of floorResolution pixels per m
+    and of the floorFormat format (png or pgm).
+
+    The fingerprint of the inputs of the file (see getArgosFileKey) is written in its header, and a file of the same
+    fingerprint is left untouched, so that the builds depending on it are not invalidated. Returns whether the file was
+    written.
+    """
+    fingerprint = getArgosFileKey(mission, **options)
+
+    floorImage = None
+    if mission.arena.floors:
+        resolution = options.get("floorResolution", defaultResolution)
+        floorImage = getFloorImageName(mission.arena, arenaSize, resolution, options.get("floorFormat", "png"))
+        floorPath = os.path.join(os.path.dirname(file_name), floorImage)
+        if not os.path.exists(floorPath):
+            exportFloorImage(mission.arena, floorPath, arenaSize, resolution)
+
+    if readFingerprint(file_name) == fingerprint:
+        return False
+    with open(file_name, 'w') as file:
+        writeArgosFile(mission, XmlWriter(file), fingerprint=fingerprint, floorImage=floorImage, **options)
+    return True
+
+
+def getArgosFileKey(mission: Mission, **options):
+    """
+    Hash of everything the .argos file generated for the mission with these options depends on : the arena, the
+    sensors and actuators of the reference model, the options, and the sources of this module, of the arena and of the
+    floor rasterizer (which names the floor image). Missions of equal keys have identical .argos files.
+    """
+    inputs = {
+        "arena": mission.arena.toJson(),
+        "inputs": list(mission.referenceModel.inputs),
+        "outputs": list(mission.referenceModel.outputs),
+        "options": options,
+    }
+    if not _generatorHash:
+        # this module, the arena (scaling the coordinates) and the floor rasterizer
+        _generatorHash.append(contentHash(moduleHash(__name__, Arena.__module__), getFloorGeneratorHash()))
+    return contentHash(_generatorHash[0], json.dumps(inputs, sort_keys=True, default=str))
+
+
+def writeArgosFile(mission: Mission, writer, **options):
+    writer.startElement("argos-configuration")
 
     if "source" in options:
-        disclaimer = ET.Comment("Generated from " + str(options["source"]))
-        disclaimer.tail = " "
-        root.append(disclaimer)
+        writer.addComment("Generated from " + str(options["source"]))
+    if "fingerprint" in options:
+        writer.addComment("Fingerprint " + options["fingerprint"])
+    if "source" in options or "fingerprint" in options:
+        writer.addText(" ")
 
     # Framework
-    addTitle(root, "Framework")
-    framework = ET.SubElement(root, "framework")
-    ET.SubElement(framework, "experiment", length="60", ticks_per_second="10", random_seed="0")
-    framework.tail = " "
+    addTitle(writer, "Framework")
+    writer.startElement("framework")
+    writer.addElement("experiment", length=str(options.get("length", 60)), ticks_per_second="10",
+                      random_seed=str(options.get("randomSeed", 0)))
+    writer.endElement(tail=" ")
 
     # Loop functions
-    addTitle(root, "Loop functions")
-    addComment(root, "TO COMPLETE ! : User needs to complete some of the following fields")
-    loop_functions = ET.SubElement(root, "loop_functions", library="PATH_TO_LOOP_FUNCTION", label="LOOP_FUNCTIONS_LABEL")
-    ET.SubElement(loop_functions, "params", dist_radius="1.2", number_robots=str(mission.arena.robotNumber))
-    loop_functions.tail = " "
+    addTitle(writer, "Loop functions")
+    addComment(writer, "TO COMPLETE ! : User needs to complete some of the following fields")
+    writer.startElement("loop_functions", library="PATH_TO_LOOP_FUNCTION", label="LOOP_FUNCTIONS_LABEL")
+    writer.addElement("params", dist_radius="1.2", number_robots=str(options.get("robotNumber", mission.arena.robotNumber)))
+    writer.endElement(tail=" ")
 
     # Controllers
-    addTitle(root, "Controllers")
-    generateController(mission, root)
+    addTitle(writer, "Controllers")
+    generateController(mission, writer)
 
     # Arena
-    addTitle(root, "Arena")
-    generateArena(mission.arena, root)
+    addTitle(writer, "Arena")
+    generateArena(mission.arena, writer, options.get("floorImage"))
 
     # E-Puck
     # distribute
 
     # Physics engines
-    addTitle(root, "Physics engines")
-    physics_engines = ET.SubElement(root, "physics_engines")
-    ET.SubElement(physics_engines, "dynamics2d", id="dyn2d")
-    physics_engines.tail = " "
+    addTitle(writer, "Physics engines")
+    writer.startElement("physics_engines")
+    writer.addElement("dynamics2d", id="dyn2d")
+    writer.endElement(tail=" ")
 
     # Media
-    addTitle(root, "Media")
-    media = ET.SubElement(root, "media")
-    ET.SubElement(media, "led", id="leds", grid_size="1,1,1")
-    ET.SubElement(media, "range_and_bearing", id="ircom")
-    ET.SubElement(media, "range_and_bearing", id="rab")
-    media.tail = " "
+    addTitle(writer, "Media")
+    writer.startElement("media")
+    writer.addElement("led", id="leds", grid_size="1,1,1")
+    writer.addElement("range_and_bearing", id="ircom")
+    writer.addElement("range_and_bearing", id="rab")
+    writer.endElement(tail=" ")
 
     # Visualization
-    addTitle(root, "Visualization")
-    visualization = ET.SubElement(root, "visualization")
-    visualization.tail = " "
+    addTitle(writer, "Visualization")
+    writer.addElement("visualization")
+    writer.addText(" ")
 
-    dom = minidom.parseString(ET.tostring(root))
-    with open(file_name, 'w') as file:
-        file.write(dom.toprettyxml(indent='  '))
+    writer.close()
 
 
-def addTitle(element, title):
+def addTitle(writer, title):
     titleStr = ' * ' + title + ' * '
     line = ' ' + '*' * (len(titleStr) - 2) + ' '
 
-    element.append(ET.Comment(line))
-    element.append(ET.Comment(titleStr))
-    element.append(ET.Comment(line))
+    writer.addComment(line)
+    writer.addComment(titleStr)
+    writer.addComment(line)
 
 
-def addComment(element, comment):
-    element.append(ET.Comment(" " + comment + " "))
+def addComment(writer, comment):
+    writer.addComment(" " + comment + " ")
 
 
-def addBox(parent, id, size=(1, 1, 1), position=(0, 0, 0), orientation=(0, 0, 0), movable=False):
+def addBox(writer, id, size=(1, 1, 1), position=(0, 0, 0), orientation=(0, 0, 0), movable=False):
     size_str = "{},{},{}".format(*size)
     position_str = "{},{},{}".format(*position)
     orientation_str = "{},{},{}".format(*orientation)
 
-    box = ET.SubElement(parent, "box", id=id, size=size_str, movable=str(movable).lower())
-    ET.SubElement(box, "body", position=position_str, orientation=orientation_str)
+    writer.startElement("box", id=id, size=size_str, movable=str(movable).lower())
+    writer.addElement("body", position=position_str, orientation=orientation_str)
+    writer.endElement()
 
 
-def addWall(parent, index, length, angle, x, y):
-    addBox(parent, "wall_" + str(index), size=(0.01, length, 0.08), position=(x, y, 0), orientation=(angle, 0, 0))
+def addWall(writer, index, length, angle, x, y):
+    addBox(writer, "wall_" + str(index), size=(0.01, length, 0.08), position=(x, y, 0), orientation=(angle, 0, 0))
 
 
-def generateArenaBorders(arena: Arena, element):
+def generateArenaBorders(arena: Arena, writer):
     shape = arena.shape
     # TODO : Square, Circle shapes
     if shape == Shape.Square:
@@ -116,90 +248,95 @@ def generateArenaBorders(arena: Arena, element):
         for i in range(n):
             x = radius * math.cos(math.radians(angle * i + offset))
             y = radius * math.sin(math.radians(angle * i + offset))
-            addWall(element, i+1, arena.sideLength, angle * i + offset, round(x, 3), round(y, 3))
+            addWall(writer, i+1, arena.sideLength, angle * i + offset, round(x, 3), round(y, 3))
 
 
-def addLight(element, light, coord_scale, id_=0):
+def addLight(writer, light, coord_scale, id_=0):
     # TODO : Points lights
     color = light.color.lower()
     angle = "{},0,0".format(light.orientation)
     pos = "{},{},0".format(light.x * coord_scale, light.y * coord_scale)
     intensity = str(round(light.strength/10, 2))
 
-    ET.SubElement(element, "light", id="light_" + str(id_), position=pos, orientation=angle, color=color, intensity=intensity, medium="leds")
+    writer.addElement("light", id="light_" + str(id_), position=pos, orientation=angle, color=color, intensity=intensity, medium="leds")
 
 
-def addFloor(element, floors):
-    # TODO : Generate a picture from the floors
-    addComment(element, "TO COMPLETE ! : User needs to complete some of the following fields")
-    ET.SubElement(element, "floor", id="floor", source="image", path="PATH_TO_FLOOR_IMAGE")
+def addFloor(writer, floorImage=None):
+    if floorImage is None:
+        addComment(writer, "TO COMPLETE ! : User needs to complete some of the following fields")
+        floorImage = "PATH_TO_FLOOR_IMAGE"
+    writer.addElement("floor", id="floor", source="image", path=floorImage)
 
 
-def addObstacle(element, obstacle, coord_scale, id_=0):
+def addObstacle(writer, obstacle, coord_scale, id_=0):
     # TODO : circle shape
     angle = (obstacle.orientation, 0, 0)
     size = (obstacle.width * coord_scale, obstacle.height * coord_scale, 0.08)
     pos = (obstacle.x * coord_scale, obstacle.y * coord_scale, 0)
-    addBox(element, "obstacle_" + str(id_), size=size, position=pos, orientation=angle)
+    addBox(writer, "obstacle_" + str(id_), size=size, position=pos, orientation=angle)
 
 
-def generateArena(arena: Arena, element):
-    arenaElement = ET.SubElement(element, "arena", size="10, 10, 1", center="0,0,0")
-    addComment(arenaElement, "{} arena with side of length {}".format(arena.shape, arena.sideLength))
-    generateArenaBorders(arena, arenaElement)
+def generateArena(arena: Arena, writer, floorImage=None):
+    writer.startElement("arena", size=f"{arenaSize}, {arenaSize}, 1", center="0,0,0")
+    addComment(writer, "{} arena with side of length {}".format(arena.shape, arena.sideLength))
+    generateArenaBorders(arena, writer)
 
-    addComment(arenaElement, "Arena floor")
-    addFloor(arenaElement, arena.floors)
+    addComment(writer, "Arena floor")
+    addFloor(writer, floorImage)
 
-    coord_scale = (arena.sideLength * shape_scale_factor[arena.shape]) / (240 * 100)
-    addComment(arenaElement, "Arena lights")
+    coord_scale = arena.getCoordScale()
+    addComment(writer, "Arena lights")
     if not arena.lights:
-        addLight(arenaElement, Light.dummyLight(), 0, 0)
+        addLight(writer, Light.dummyLight(), 0, 0)
     for l_id, light in enumerate(arena.lights):
-        addLight(arenaElement, light, coord_scale, l_id)
+        addLight(writer, light, coord_scale, l_id)
 
-    addComment(arenaElement, "Arena obstacles")
+    addComment(writer, "Arena obstacles")
     for o_id, obstacle in enumerate(arena.obstacles):
-        addObstacle(arenaElement, obstacle, coord_scale, o_id)
+        addObstacle(writer, obstacle, coord_scale, o_id)
 
-    arenaElement.tail = " "
+    writer.endElement(tail=" ")
 
 
-# sensors
+# sensors (tag and attributes)
 controller_input = {
-    "prox": ET.Element("epuck_proximity", implementation="default", show_rays="false", noise_level="0.05", calibrated="true"),
-    "gnd": ET.Element("epuck_ground", implementation="rot_z_only", noise_level="0.05", calibrated="true"),
-    "light": ET.Element("epuck_light", implementation="default", show_rays="false", noise_level="0.05", calibrated="true"),
-    "cam": ET.Element("epuck_omnidirectional_camera", implementation="rot_z_only", medium="leds", show_rays="false")
+    "prox": ("epuck_proximity", {"implementation": "default", "show_rays": "false", "noise_level": "0.05", "calibrated": "true"}),
+    "gnd": ("epuck_ground", {"implementation": "rot_z_only", "noise_level": "0.05", "calibrated": "true"}),
+    "light": ("epuck_light", {"implementation": "default", "show_rays": "false", "noise_level": "0.05", "calibrated": "true"}),
+    "cam": ("epuck_omnidirectional_camera", {"implementation": "rot_z_only", "medium": "leds", "show_rays": "false"})
 }
 
-# actuators
+# actuators (tag and attributes)
 controller_output = {
-    "wheels": ET.Element("epuck_wheels", implementation="default", noise_std_dev="0.05"),
-    "leds": ET.Element("epuck_rgb_leds", implementation="default", medium="leds"),
+    "wheels": ("epuck_wheels", {"implementation": "default", "noise_std_dev": "0.05"}),
+    "leds": ("epuck_rgb_leds", {"implementation": "default", "medium": "leds"}),
 }
 
 
-def generateController(mission, element):
+def generateController(mission, writer):
     # TODO : controllers
-    controllers = ET.SubElement(element, "controllers")
-    controllers.tail = " "
+    writer.startElement("controllers")
 
-    addComment(controllers, "TRANSMITTER")
-    addComment(controllers, "TO COMPLETE ! : User needs to complete some of the following fields")
-    automode = ET.SubElement(controllers, "automode_controller", id="automode", library="PATH_TO_AUTOMODE")
+    addComment(writer, "TRANSMITTER")
+    addComment(writer, "TO COMPLETE ! : User needs to complete some of the following fields")
+    writer.startElement("automode_controller", id="automode", library="PATH_TO_AUTOMODE")
 
-    actuators = ET.SubElement(automode, "actuators")
+    writer.startElement("actuators")
     for elem in mission.referenceModel.outputs:
         if elem in controller_output:
-            actuators.append(controller_output[elem])
-    ET.SubElement(actuators, "epuck_range_and_bearing", implementation="medium", medium="rab", data_size="4", range="0.7")
+            writer.addElement(*controller_output[elem])
+    writer.addElement("epuck_range_and_bearing", implementation="medium", medium="rab", data_size="4", range="0.7")
+    writer.endElement()
 
-    sensors = ET.SubElement(automode, "sensors")
+    writer.startElement("sensors")
     for elem in mission.referenceModel.inputs:
         if elem in controller_input:
-            sensors.append(controller_input[elem])
-    ET.SubElement(sensors, "epuck_range_and_bearing", implementation="medium", medium="rab", data_size="4", nois_std_deviation="1.5", loss_probability="0.85", calibrated="true")
+            writer.addElement(*controller_input[elem])
+    writer.addElement("epuck_range_and_bearing", implementation="medium", medium="rab", data_size="4", nois_std_deviation="1.5", loss_probability="0.85", calibrated="true")
+    writer.endElement()
 
     fsm_config = "TO_COMPLETE"
-    ET.SubElement(automode, "params", attrib={"readable": "false", "history": "false", "hist-folder": "./fsm_history/", "fsm-config": fsm_config})
+    writer.addElement("params", attrib={"readable": "false", "history": "false", "hist-folder": "./fsm_history/", "fsm-config": fsm_config})
+    writer.endElement()
+
+    writer.endElement(tail=" ")
@@ -0,0 +1,123 @@
+"""
+Rasterization of the floors of an arena into the image of the ARGoS floor entity
+"""
+import json
+import math
+import os
+import shutil
+import struct
+import zlib
+
+import numpy as np
+
+from src.util import Color, ResourceLoader, Shape, contentHash, moduleHash, replaceFile
+
+imagePrefix = "floor_"
+imageFormats = ("png", "pgm")
+defaultResolution = 100  # pixels per m
+_generatorHash = []  # hash of the rasterizer sources, computed on first use by getGeneratorHash
+
+# gray level of each floor color, the floor being white where there is no floor object
+floorLevels = {
+    Color.Black: 0,
+    Color.Gray: 128,
+    Color.White: 255,
+}
+
+
+def rasterizeFloors(arena, size, resolution=defaultResolution):
+    """
+    Gray levels image of the floors of the arena, covering a square of the given size (in m) centered on the arena,
+    with the first row at the top (largest y) as in the ARGoS floor entity. Floors are painted in order, each one over
+    the pixels of its bounding box at once, a pixel being painted if its center is inside the floor.
+    """
+    pixels = max(1, round(size * resolution))
+    image = np.full((pixels, pixels), floorLevels[Color.White], dtype=np.uint8)
+    scale = arena.getCoordScale()
+    half = size / 2
+
+    for floor in arena.floors:
+        if Shape[floor.shape] == Shape.Rectangle:
+            angle = math.radians(floor.orientation)
+            extentX = (abs(floor.width * math.cos(angle)) + abs(floor.height * math.sin(angle))) / 2
+            extentY = (abs(floor.width * math.sin(angle)) + abs(floor.height * math.cos(angle))) / 2
+        else:
+            extentX = extentY = floor.radius
+
+        columns = slice(max(0, math.floor(((floor.x - extentX) * scale + half) * resolution)),
+                        min(pixels, math.ceil(((floor.x + extentX) * scale + half) * resolution)))
+        rows = slice(max(0, math.floor((half - (floor.y + extentY) * scale) * resolution)),
+                     min(pixels, math.ceil((half - (floor.y - extentY) * scale) * resolution)))
+        if columns.start >= columns.stop or rows.start >= rows.stop:
+            continue
+
+        # centers of the pixels of the bounding box, in the arena units
+        x = ((np.arange(columns.start, columns.stop) + 0.5) / resolution - half) / scale
+        y = (half - (np.arange(rows.start, rows.stop) + 0.5) / resolution) / scale
+        inside = floor.contains(x[np.newaxis, :], y[:, np.newaxis])
+        image[rows, columns][inside] = floorLevels[Color[floor.color]]
+
+    return image
+
+
+def writeImage(path, extension, image):
+    """
+    Writes a gray levels image as an 8 bits PNG or binary PGM file, depending on the extension (.png or .pgm).
+    """
+    height, width = image.shape
+    if extension.lower() == ".pgm":
+        data = f"P5\n{width} {height}\n255\n".encode() + image.tobytes()
+    else:
+        rows = np.zeros((height, width + 1), dtype=np.uint8)  # each row starts with its filter type, none
+        rows[:, 1:] = image
+        data = b"\x89PNG\r\n\x1a\n" \
+            + pngChunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)) \
+            + pngChunk(b"IDAT", zlib.compress(rows.tobytes())) \
+            + pngChunk(b"IEND", b"")
+
+    with open(path, 'wb') as file:
+        file.write(data)
+
+
+def pngChunk(tag, data):
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+
+def getFloorImageName(arena, size, resolution=defaultResolution, imageFormat="png"):
+    """
+    File name of the floor image of the arena, from the hash of the floors, of what places them in the image and of
+    the rasterizer sources, so that a cached image is not reused once the rasterizer changes.
+    """
+    if imageFormat not in imageFormats:
+        raise ValueError(f"Unknown floor image format {imageFormat}, the formats are {', '.join(imageFormats)}")
+    inputs = {
+        "floors": [floor.toJson() for floor in arena.floors],
+        "scale": arena.getCoordScale(),
+        "size": size,
+        "resolution": resolution,
+        "levels": {color.name: level for color, level in floorLevels.items()},
+    }
+    return f"{imagePrefix}{contentHash(getGeneratorHash(), json.dumps(inputs, sort_keys=True))[:16]}.{imageFormat}"
+
+
+def getGeneratorHash():
+    """
+    Hash of the sources of the rasterizer, this module and the contains method of the floors, computed once per process.
+    """
+    if not _generatorHash:
+        _generatorHash.append(moduleHash(__name__, "src.models.arenaObjects.base"))
+    return _generatorHash[0]
+
+
+def exportFloorImage(arena, path, size, resolution=defaultResolution):
+    """
+    Writes the floor image of the arena at the path, named by getFloorImageName. The images are cached by name, so
+    that the floors are only rasterized once, and written under a temporary name, as several processes can export the
+    same image.
+    """
+    cachePath = ResourceLoader.getCachePath(os.path.basename(path))
+    if not os.path.exists(cachePath):
+        image = rasterizeFloors(arena, size, resolution)
+        replaceFile(cachePath, lambda temporaryPath: writeImage(temporaryPath, os.path.splitext(path)[1], image))
+    replaceFile(path, lambda temporaryPath: shutil.copyfile(cachePath, temporaryPath))
+
@@ -0,0 +1,116 @@
+"""
+Scoring of the recorded experiments of a mission, in a process pool
+
+Usage : python -m src.models.logScoring mission.json logFolder [output.csv] [workers]
+"""
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from src.models.mission import loadMission
+from src.models.objectiveUtils.stageParser import getStageParser
+from src.models.trajectoryLog import TrajectoryLog
+
+logExtensions = (".csv", ".npy", ".bin")
+
+# mission and stage parser of a worker process, loaded once by initWorker
+worker = {}
+
+
+class LogScore:
+    """
+    Result of the scoring of one log : the objective value, and the sum of each post step stage over the experiment.
+    Logs that cannot be read or evaluated have an error instead.
+    """
+    def __init__(self, path, ticks=0, robotNumber=0, objective=None, stageTotals=None, error=None):
+        self.path = path
+        self.ticks = ticks
+        self.robotNumber = robotNumber
+        self.objective = objective
+        self.stageTotals = {} if stageTotals is None else stageTotals
+        self.error = error
+
+
+def initWorker(missionPath, chunkSize):
+    """
+    Loads the mission of the worker process, and parses its stages once : the parsed stages are then reused from the
+    stage cache for every log.
+    """
+    mission = loadMission(missionPath)
+    parser = getStageParser()
+    objective = mission.objective
+    for role, stages in (("init", objective.initStages), ("postStep", objective.postStepStages),
+                         ("postExp", objective.postExpStages)):
+        for stage in stages:
+            if stage.code:
+                parser.parseStage(stage.code, role)
+    worker.update(mission=mission, parser=parser, chunkSize=chunkSize)
+
+
+def scoreLog(path):
+    mission = worker["mission"]
+    try:
+        log = TrajectoryLog(path, robotNumber=mission.arena.robotNumber)
+        stageTotals = {}
+        value = log.evaluate(mission.objective, mission.arena, worker["chunkSize"], worker["parser"], stageTotals)
+        return LogScore(path, log.ticks, log.robotNumber, value, stageTotals)
+    except Exception as e:  # a broken log should not stop the scoring of the others
+        return LogScore(path, error=f"{type(e).__name__} : {e}")
+
+
+def findLogs(folder):
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                  if os.path.splitext(name)[1].lower() in logExtensions)
+
+
+def scoreLogs(missionPath, paths, maxWorkers=None, chunkSize=1024):
+    """
+    Yields the LogScore of each log (in order), evaluated in a process pool.
+    """
+    paths = list(paths)
+    maxWorkers = maxWorkers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=maxWorkers, initializer=initWorker,
+                             initargs=(missionPath, chunkSize)) as executor:
+        yield from executor.map(scoreLog, paths, chunksize=max(1, len(paths) // (4 * maxWorkers)))
+
+
+def writeScores(file, scores, stageNames):
+    """
+    Writes the scores to a CSV table, with a column for the total of each post step stage. Returns the scores.
+    """
+    writer = csv.writer(file)
+    writer.writerow(["log", "ticks", "robots", "objective"] + stageNames + ["error"])
+    written = []
+    for score in scores:
+        writer.writerow([score.path, score.ticks, score.robotNumber, score.objective]
+                        + [score.stageTotals.get(name) for name in stageNames] + [score.error or ""])
+        written.append(score)
+    return written
+
+
+def main(missionPath, logFolder, outputPath="scores.csv", maxWorkers=None):
+    maxWorkers = maxWorkers or os.cpu_count() or 1
+    stageNames = [stage.name for stage in loadMission(missionPath).objective.postStepStages]
+    paths = findLogs(logFolder)
+
+    start = time.perf_counter()
+    with open(outputPath, 'w', newline='') as file:
+        scores = writeScores(file, scoreLogs(missionPath, paths, maxWorkers), stageNames)
+    duration = time.perf_counter() - start
+
+    ticks = sum(score.ticks for score in scores)
+    errors = sum(score.error is not None for score in scores)
+    print(f"Scored {len(scores) - errors}/{len(scores)} logs in {duration:.2f} s with {maxWorkers} workers "
+          f"({len(scores) / duration:.1f} logs/s, {ticks / duration:,.0f} ticks/s), written to {outputPath}")
+    for score in scores:
+        if score.error is not None:
+            print(f"  {score.path} : {score.error}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(1)
+    main(*sys.argv[1:4], *map(int, sys.argv[4:5]))
@@ -1,7 +1,12 @@
+import json
 from collections import defaultdict
 
 from src.models.arena import Arena
+from src.models.behavior import Behavior
 from src.models.objective import Objective
+from src.models.robot import RobotModel
+from src.models.skill import Skill
+from src.util import ResourceLoader
 
 
 class Mission:
@@ -85,3 +90,32 @@ class Mission:
             self.behaviorsLinks[b_id] -= 1
             if self.behaviorsLinks[b_id] <= 0:
                 self.behaviors[b_id].setActive(False)
+
+
+def loadMission(path, modelPath="model.json"):
+    """
+    Loads a mission file outside of the application (no views nor controllers), with the skills, behaviors and
+    reference models of the given model file.
+    """
+    with ResourceLoader.openData(modelPath) as modelFile:
+        modelData = json.load(modelFile)
+
+    skills = {}
+    for data in modelData["Skills"]:
+        skill = Skill(data)
+        skills[skill.id] = skill
+
+    behaviors = {}
+    for data in modelData["Behaviors"]:
+        behavior = Behavior(data)
+        behaviors[behavior.id] = behavior
+        for s_id in behavior.skills:
+            skills[s_id].linkBehavior(behavior.id)
+
+    referenceModels = {}
+    for data in modelData["ReferenceModels"]:
+        model = RobotModel(data)
+        referenceModels[model.reference] = model
+
+    with open(path, 'r') as missionFile:
+        return Mission(skills, behaviors, referenceModels, json.load(missionFile))
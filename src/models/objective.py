@@ -10,12 +10,16 @@ class Objective:
         self.postStepStages = []
         self.postExpStages = []
         self.initStages = []
+        self.evaluationPeriod = 1  # ticks between two evaluations of the post step function
+        self.rescaleEvaluation = False  # multiplies the evaluations by the period, to approximate every tick
 
         if data:
             self.loadFromData(data)
 
     def loadFromData(self, data):
         self.name = data.get("name", self.name)
+        self.evaluationPeriod = data.get("evaluationPeriod", self.evaluationPeriod)
+        self.rescaleEvaluation = data.get("rescaleEvaluation", self.rescaleEvaluation)
         if "postStepStages" in data:
             self.postStepStages = [Stage(stage) for stage in data["postStepStages"]]
         if "postExpStages" in data:
@@ -26,6 +30,8 @@ class Objective:
     def toJson(self):
         return {
             "name": self.name,
+            "evaluationPeriod": self.evaluationPeriod,
+            "rescaleEvaluation": self.rescaleEvaluation,
             "postStepStages": [stage.toJson() for stage in self.postStepStages],
             "postExpStages": [stage.toJson() for stage in self.postExpStages],
             "initStages": [stage.toJson() for stage in self.initStages],
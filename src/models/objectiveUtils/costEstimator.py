@@ -0,0 +1,184 @@
+"""
+Static Cost Estimation of the objective stages
+
+Usage : python -m src.models.objectiveUtils.costEstimator mission.json [robotNumber]
+"""
+import sys
+
+from lark.exceptions import LarkError
+
+from src.models.mission import loadMission
+from src.models.objectiveUtils.stageParser import getStageParser, CompilationContext
+
+# operations of a function from the sizes (count, degree in the number of robots) of its first and second list arguments
+complexities = {
+    "O(1)": lambda n, m: (1, 0),
+    "O(N)": lambda n, m: n,
+    "O(N*M)": lambda n, m: (n[0] * m[0], n[1] + m[1]),
+    "O(N^2)": lambda n, m: (n[0] ** 2, 2 * n[1]),
+}
+
+
+class StageCost:
+    """
+    Estimated cost of one evaluation of a stage : operations, bytes of temporary lists, and degree of the operations
+    count in the number of robots (2 for a quadratic stage). Stages that cannot be parsed have an error instead.
+    """
+    def __init__(self, name, error=None):
+        self.name = name
+        self.operations = 0
+        self.memory = 0
+        self.degree = 0
+        self.error = error
+
+    def isQuadratic(self):
+        return self.degree >= 2
+
+
+class CostEstimator:
+    """
+    Estimates the cost of the post step stages of an objective, from the complexity of the model functions and the
+    number of robots. As in the generated code, the computations hoisted in Init are free, and so are the pure function
+    calls already computed by a previous stage. The length of a list returned by a function is its operations count.
+    """
+    def __init__(self, robotNumber, parser=None):
+        self.robotNumber = robotNumber
+        self.context = CompilationContext(getStageParser() if parser is None else parser)
+        self.listTypes = self.context.listTypes
+        self.elementSizes = self.context.parser.getElementSizes()
+        self.computed = {}  # key of the pure function calls already computed -> size of their result
+        self.collected = set()  # model variables already collected
+
+    def estimateObjective(self, objective):
+        return [self.estimateStage(stage) for stage in objective.postStepStages]
+
+    def estimateStage(self, stage):
+        if not stage.code:
+            return StageCost(stage.name)
+
+        try:
+            stageNode = self.context.parseStage(stage.code, "postStep")
+        except (LarkError, KeyError) as e:
+            message = str(e).strip().splitlines()[0] if str(e).strip() else ""
+            return StageCost(stage.name, error=f"{type(e).__name__} : {message}")
+
+        cost = StageCost(stage.name)
+        self.estimateNode(stageNode, cost)
+        return cost
+
+    def estimateNode(self, node, cost):
+        """
+        Adds the cost of the subtree to the stage cost, and returns the size of its value (count, degree).
+        """
+        if node.rule == "func":
+            return self.estimateFunction(node, cost)
+        if node.rule == "var":
+            return self.estimateVariable(node, cost)
+
+        for child in node.children:
+            self.estimateNode(child, cost)
+        if node.children:  # arithmetic operation
+            cost.operations += 1
+        return 1, 0
+
+    def estimateFunction(self, node, cost):
+        if node.pure and node.key in self.computed:
+            return self.computed[node.key]
+
+        sizes = [self.estimateNode(child, cost) for child in node.children]
+        listSizes = [size for child, size in zip(node.children, sizes) if child.valueType in self.listTypes]
+        n = listSizes[0] if listSizes else (1, 0)
+        m = listSizes[1] if len(listSizes) > 1 else (1, 0)
+        operations = complexities[node.data.get("complexity", "O(1)")](n, m)
+        self.addOperations(cost, operations)
+
+        size = (1, 0)
+        if node.valueType in self.listTypes:
+            size = operations
+            cost.memory += size[0] * self.elementSizes.get(node.valueType, 0)
+
+        if node.pure:
+            self.computed[node.key] = size
+        else:  # the call may modify any variable
+            self.computed.clear()
+        return size
+
+    def estimateVariable(self, node, cost):
+        if node.valueType not in self.listTypes:
+            return 1, 0
+
+        size = (self.robotNumber, 1)  # lists of the model and hoisted lists are taken as one element per robot
+        if "code" in node.data and node.value not in self.collected:  # model variable, collected on every tick
+            self.collected.add(node.value)
+            self.addOperations(cost, size)
+            cost.memory += size[0] * self.elementSizes.get(node.valueType, 0)
+        return size
+
+    @staticmethod
+    def addOperations(cost, operations):
+        count, degree = operations
+        cost.operations += count
+        cost.degree = max(cost.degree, degree)
+
+
+def estimateObjectiveCost(objective, robotNumber):
+    """
+    Estimated cost of each post step stage of the objective, for the given number of robots.
+    """
+    return CostEstimator(robotNumber).estimateObjective(objective)
+
+
+def formatCostReport(costs, robotNumber, evaluationPeriod=1):
+    """
+    Text report of the stage costs, per tick of the experiment, with a warning for each quadratic stage.
+    """
+    period = max(1, evaluationPeriod)
+    lines = []
+    warnings = []
+    operations = 0
+    memory = 0
+
+    for cost in costs:
+        if cost.error is not None:
+            lines.append(f"{cost.name} : invalid code ({cost.error})")
+            continue
+        operations += cost.operations
+        memory += cost.memory
+        lines.append(f"{cost.name} : {formatOperations(cost.operations / period)} operations, "
+                     f"{formatMemory(cost.memory)} of temporaries")
+        if cost.isQuadratic() and robotNumber > 1:
+            warnings.append(f"Warning : {cost.name} is quadratic in the number of robots "
+                            f"({formatOperations(cost.operations / period)} operations per tick)")
+
+    header = f"Estimated cost per tick for {robotNumber} robots"
+    if period > 1:
+        header += f", evaluated every {period} ticks"
+    total = f"Total : {formatOperations(operations / period)} operations, {formatMemory(memory)} of temporaries"
+    return "\n".join([header] + lines + [total] + warnings)
+
+
+def formatOperations(operations):
+    return f"{operations:,.0f}" if operations >= 1 or operations == 0 else f"{operations:.2f}"
+
+
+def formatMemory(memory):
+    for unit in ("B", "kB", "MB"):
+        if memory < 1000:
+            return f"{memory:.0f} {unit}" if unit == "B" else f"{memory:.1f} {unit}"
+        memory /= 1000
+    return f"{memory:.1f} GB"
+
+
+def main(missionPath, robotNumber=None):
+    mission = loadMission(missionPath)
+    if robotNumber is None:
+        robotNumber = mission.arena.robotNumber
+    costs = estimateObjectiveCost(mission.objective, robotNumber)
+    print(formatCostReport(costs, robotNumber, mission.objective.evaluationPeriod))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(1)
+    main(sys.argv[1], *map(int, sys.argv[2:]))
@@ -1,56 +1,119 @@
 """
 Loop Functions Generation utilities
 """
+import itertools
+import json
+import os
 from math import pi
 from os.path import splitext
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from string import Template
 
-from src.models.objectiveUtils.stageParser import StageParser, CppTransformer
-from src.util import ResourceLoader, cleanIdentifier, Shape, shape_scale_factor
+from src.models.objectiveUtils.stageParser import getStageParser, CompilationContext
+from src.util import ResourceLoader, cleanIdentifier, contentHash, moduleHash, readFingerprint, Shape, \
+    shape_scale_factor
+
+templateFiles = ("TemplateLoopFunction.cpp", "TemplateLoopFunction.h")
+_generatorHash = []  # hash of the generator sources, computed on first use by getGeneratorHash
 
 
 def generateLoopFunctions(mission, filePath, **options):
+    """
+    Writes the .cpp and .h files of the loop functions of the mission, named after filePath. The fingerprint of their
+    inputs (see getLoopFunctionsKey) is written in their header, and a file of the same fingerprint is left untouched,
+    so that the builds depending on it are not invalidated. Returns whether a file was written.
+    """
     content = defaultdict(str)
 
     basePath = splitext(filePath)[0]
     cppPath = f"{basePath}.cpp"
     hPath = f"{basePath}.h"
-    cppRawTemplate, hRawTemplate = getTemplates("TemplateLoopFunction.cpp", "TemplateLoopFunction.h")
+    fingerprint = getLoopFunctionsKey(mission, **options)
+    outdated = [path for path in (cppPath, hPath) if readFingerprint(path) != fingerprint]
+    if not outdated:
+        return False
+
+    cppRawTemplate, hRawTemplate = getTemplates(*templateFiles)
     cppTemplate = Template(cppRawTemplate)
     hTemplate = Template(hRawTemplate)
 
-    parser = StageParser("objective_model.json", "objective_grammar.lark")
+    context = CompilationContext(getStageParser(), memberBuffers=options.get("memberBuffers", False),
+                                 instrument=options.get("instrument", False))
 
     objective = mission.objective
 
-    if "source" in options:
-        content["source_header"] = generateSourceHeader(options["source"])
+    content["source_header"] = generateSourceHeader(options.get("source"), fingerprint)
 
-    functions = set()
-    variables = set()
     content.update(getObjectiveNames(objective.name))
+    content["parallel_macros"] = generateParallelMacros(options.get("parallel", False))
+
+    content["post_step_function"] = generatePostStepCall(objective)
+    content["compute_step_function"] = generatePostStepCode(objective.postStepStages, context)
+    content["post_experiment_function"] = generatePostExpCode(objective.postExpStages, context)
+    # after the other functions, as it also computes what they hoisted
+    content["init_function"], content["private_variables"] = generateInitCode(objective.initStages, context)
+    content["reset_function"], content["instrumentation_report"] = generateInstrumentationCode(context)
+    # TODO : every var not defined in model needs to be in the private vars
+
+    substitutions = {
+        "objective_name": content["objective_name"],
+        "parallel_threshold": options.get("parallelThreshold", 128),
+    }
+    content["private_function_decl"], content["private_function_def"] = generateFunctionCode(context.functions, context.getFunctionData(), substitutions)
 
-    content["compute_step_function"], postStepFuncs, postStepVars = generatePostStepCode(objective.postStepStages, parser)
-    functions.update(postStepFuncs)
-    variables.update(postStepVars)  # TODO : every var not defined in model needs to be in the private vars
-
-    content["post_experiment_function"], postExpFuncs, postExpVars = generatePostExpCode(objective.postExpStages, parser)
-    functions.update(postExpFuncs)
-    variables.update(postExpVars)
-
-    content["init_function"], content["private_variables"], initFuncs, initVars = generateInitCode(objective.initStages, parser)
-    functions.update(initFuncs)
-    variables.update(initVars)
+    content["random_position_function"] = generateRandomPositionFunctionCode(mission.arena)
 
-    content["private_function_decl"], content["private_function_def"] = generateFunctionCode(functions, parser.getFunctions(), content["objective_name"])
+    for path, template in ((cppPath, cppTemplate), (hPath, hTemplate)):
+        if path in outdated:
+            with open(path, 'w') as file:
+                file.write(template.substitute(content))
+    return True
+
+
+def generateLoopFunctionsBatch(jobs, maxWorkers=None, **options):
+    """
+    Generates the loop functions of several missions at once, in a process pool : the generation is pure Python, so
+    threads would not run it in parallel. jobs is an iterable of (mission, filePath) pairs, and the options are given to
+    every generation. Returns whether each file was written, in order.
+    """
+    jobs = list(jobs)
+    maxWorkers = min(maxWorkers or os.cpu_count() or 1, len(jobs))
+    if maxWorkers <= 1:  # not worth starting processes and building their parser
+        return [generateLoopFunctions(mission, filePath, **options) for mission, filePath in jobs]
+    with ProcessPoolExecutor(max_workers=maxWorkers, initializer=getStageParser) as executor:
+        return list(executor.map(generateLoopFunctionsJob, jobs, itertools.repeat(options),
+                                 chunksize=max(1, len(jobs) // (4 * maxWorkers))))
+
+
+def generateLoopFunctionsJob(job, options):
+    mission, filePath = job
+    return generateLoopFunctions(mission, filePath, **options)
+
+
+def getLoopFunctionsKey(mission, **options):
+    """
+    Hash of everything the loop functions generated for the mission with these options depend on : the objective, what
+    is taken from the arena (the spawn code), the options, and the generator itself (templates, objective model,
+    grammar and this module). Missions of equal keys have identical loop functions.
+    """
+    inputs = {
+        "objective": mission.objective.toJson(),
+        "randomPosition": generateRandomPositionFunctionCode(mission.arena),
+        "options": options,
+    }
+    return contentHash(getGeneratorHash(), json.dumps(inputs, sort_keys=True, default=str))
 
-    content["random_position_function"] = generateRandomPositionFunctionCode(mission.arena)
 
-    with open(cppPath, 'w') as file:
-        file.write(cppTemplate.substitute(content))
-    with open(hPath, 'w') as file:
-        file.write(hTemplate.substitute(content))
+def getGeneratorHash():
+    """
+    Hash of the sources of the generated code, computed once per process.
+    """
+    if not _generatorHash:
+        # this module, the parser and code generator of the stages, and the utilities naming and placing the code
+        sources = moduleHash(__name__, CompilationContext.__module__, moduleHash.__module__)
+        _generatorHash.append(contentHash(*getTemplates(*templateFiles), getStageParser().sourceHash, sources))
+    return _generatorHash[0]
 
 
 # -----------------------------------------------------------------------------
@@ -73,56 +136,106 @@ def getObjectiveNames(name):
     }
 
 
-def generateSourceHeader(source):
-    return f"// File Generated from {source}"
+def generateSourceHeader(source, fingerprint):
+    header = f"// Fingerprint {fingerprint}"
+    return header if source is None else f"// File Generated from {source}\n{header}"
+
+
+def generateParallelMacros(parallel):
+    """
+    Definition of the OMP_PARALLEL_FOR macro preceding the per-robot loops of the model functions. With the parallel
+    option, it expands to an OpenMP pragma when compiled with OpenMP, otherwise the loops stay serial.
+    """
+    code = "#ifndef OMP_PARALLEL_FOR\n"
+    if parallel:
+        code += "#ifdef _OPENMP\n" \
+                "#include <omp.h>\n" \
+                "#define OMP_PRAGMA(x) _Pragma(#x)\n" \
+                "#define OMP_PARALLEL_FOR(...) OMP_PRAGMA(omp parallel for __VA_ARGS__)\n" \
+                "#else\n" \
+                "#define OMP_PARALLEL_FOR(...)\n" \
+                "#endif\n"
+    else:
+        code += "#define OMP_PARALLEL_FOR(...)\n"
+    return code + "#endif"
 
 
-def generateFunctionCode(functions, data, objective_name):
+def generateFunctionCode(functions, data, substitutions):
+    """
+    Declarations and definitions of the given functions (names of the model overloads), and of the functions they
+    require. Unused functions of the model are left out, and templates are only instantiated for the given overloads.
+    """
     declarations = "    /********* Generated Functions **********/\n\n"
     definitions = "/********* Generated Functions **********/\n\n"
+    instantiations = ""
 
-    # dependencies = set()
-    # first scan to add all dependencies
-    # for function in data.values():
-    #     if function["call"] in functions and "requires" in function:
-    #         functions.update(function["requires"])
-    #
-    # for function in data.values():
-    #     if function["call"] in functions:
-    #         declarations += "    " + function["declaration"]
-    #         definitions += "\n" + function["definition"]
-    #         if "requires" in function:
-    #             functions.update(function["requires"])
-    #
-    for function in data.values():
+    required = getRequiredFunctions(functions, data)
+    for function in data:
+        if function["name"] not in required:
+            continue
         if function["declaration"]:
             declarations += "    " + function["declaration"]
         if function["definition"]:
             definitions += "\n" + function["definition"]
+        if function["name"] in functions:  # templates required by other definitions are instantiated implicitly
+            instantiations += function.get("instantiation", "")
+
+    if instantiations:
+        definitions += "\n" + instantiations
 
-    definitions = Template(definitions).substitute({
-        "objective_name": objective_name
-    })
+    definitions = Template(definitions).substitute(substitutions)
 
     return declarations, definitions
 
 
-def generateVariableInitialisation(variables, varData):
+def getRequiredFunctions(functions, data):
+    """
+    Names of the given functions, and of every function they require (directly or not).
+    """
+    functionsByName = {function["name"]: function for function in data}
+    required = set()
+    pending = list(functions)
+
+    while pending:
+        name = pending.pop()
+        if name not in required:
+            required.add(name)
+            pending.extend(functionsByName[name].get("requires", []))
+
+    return required
+
+
+def generateVariableInitialisation(variables, context, role):
+    """
+    Code initialising the given model variables in a function of the given role. Lists are references to member
+    buffers if the context uses them for this role (see CompilationContext.getBuffers).
+    """
+    varData = context.getVariableData()
+    buffers = context.getBuffers(role)
     initialisation = ""
     for var in variables:
-        if var in varData:
-            initialisation += varData[var]["code"]
+        if var not in varData:
+            continue
+        data = varData[var]
+        typeCode = context.types[data["type"]]
+        if buffers is not None and data["type"] in context.listTypes and "declaration" in data:
+            member = f"m_Buffer_{var}"
+            buffers.append((member, typeCode))
+            initialisation += f"  {typeCode}& {var} = {member};\n  {var}.clear();\n"
+        else:
+            initialisation += data.get("declaration", "")
+        initialisation += data["code"]
     return initialisation
 
 
 # -----------------------------------------------------------------------------
 
-def generateStageCode(stages, parser):
+def generateStageCode(stages, context, role):
     initialisation = "Real temp = 0;\n"
     code = ""
-    CppTransformer.tempVarIndex = 0
-    functions = set()
+    generator = context.createGenerator(role)
     variables = set()
+    timed = False
 
     for stage in stages:
         stageVar = cleanIdentifier(stage.name)
@@ -131,45 +244,60 @@ def generateStageCode(stages, parser):
         if not stage.code:
             continue
 
-        stageNode = parser.parse(stage.code)
-        stageNode.assignToStage(stageVar)  # TODO : verify final node is of type "Real"
-        code += stageNode.code
-
-        functions.update(stageNode.getFunctions())
+        stageNode = context.parseStage(stage.code, role)
+        if context.instrument:
+            timed = True
+            timing = context.addTimedStage(stage.name if role == "postStep" else f"{stage.name} ({role})")
+            code += "  stageStart = std::chrono::steady_clock::now();\n"
+        code += generator.generateAssignment(stageNode, stageVar)  # TODO : verify final node is of type "Real"
+        if context.instrument:
+            code += f"  m_StageTimings[{timing}].Record(stageStart);\n"
         variables.update(stageNode.getVariables())
 
         if stage.increment:
             code += f"  temp += {stageVar};\n"
 
-    return initialisation, code, functions, variables
+    if timed:
+        initialisation += "  std::chrono::steady_clock::time_point stageStart;\n"
+    initialisation += generateVariableInitialisation(variables, context, role)
+    return initialisation, code
 
 
-def generatePostStepCode(stages, parser):
-    initialisation, code, functions, variables = generateStageCode(stages, parser)
+def generatePostStepCode(stages, context):
+    initialisation, code = generateStageCode(stages, context, "postStep")
     code += "\n  return temp;"
-    varData = parser.getVariables()
-    initialisation += generateVariableInitialisation(variables, varData)
-    return initialisation + code, functions, variables
+    return initialisation + code
 
 
-def generatePostExpCode(stages, parser):
+def generatePostStepCall(objective):
+    """
+    Body of PostStep, evaluating the post step function every evaluationPeriod ticks of the objective. If the objective
+    rescales its evaluations, they are multiplied by the period so that the result stays comparable.
+    """
+    period = max(1, int(objective.evaluationPeriod))
+    if period == 1:
+        return "m_ObjectiveFunction += ComputeStepObjectiveValue();"
+
+    value = f"{period} * ComputeStepObjectiveValue()" if objective.rescaleEvaluation else "ComputeStepObjectiveValue()"
+    return f"if (GetSpace().GetSimulationClock() % {period} == 0) {{\n" \
+           f"\t\tm_ObjectiveFunction += {value};\n" \
+           "\t}"
+
+
+def generatePostExpCode(stages, context):
     if True in [s.increment for s in stages]:  # at least one stage is used
-        initialisation, code, functions, variables = generateStageCode(stages, parser)
+        initialisation, code = generateStageCode(stages, context, "postExp")
         code += "\n  m_ObjectiveFunction = temp;"
-        varData = parser.getVariables()
-        initialisation += generateVariableInitialisation(variables, varData)
     else:
-        initialisation, code, functions, variables = "", "", set(), set()
-    return initialisation + code, functions, variables
+        initialisation, code = "", ""
+    return initialisation + code
 
 
-def generateInitCode(stages, parser):
+def generateInitCode(stages, context):
     code = ""
-    CppTransformer.tempVarIndex = 0
-    functions = set()
     variables = set()
     variableHeader = ""
-    types = parser.getTypes()
+    generator = context.createGenerator("init")
 
     for variable in stages:
         varName = cleanIdentifier(variable.name)
@@ -177,18 +305,46 @@ def generateInitCode(stages, parser):
         if not variable.code:
             continue
 
-        stageNode = parser.parse(variable.code)
-        stageNode.assignToStage(varName)
-        code += stageNode.code
-        variableHeader += f"    {types[stageNode.valueType]} {varName};\n"
-
-        functions.update(stageNode.getFunctions())
+        stageNode = context.parseStage(variable.code, "init")
+        code += generator.generateAssignment(stageNode, varName)
+        variableHeader += f"    {context.types[stageNode.valueType]} {varName};\n"
         variables.update(stageNode.getVariables())
 
-    varData = parser.getVariables()
-    initialisation = generateVariableInitialisation(variables, varData)
-
-    return initialisation + code, variableHeader, functions, variables
+    for member, stageNode in context.getHoisted():
+        code += generator.generateAssignment(stageNode, member)
+        variableHeader += f"    {context.types[stageNode.valueType]} {member};\n"
+
+    for member, typeCode in context.buffers:
+        code += f"  {member}.reserve(m_unNumberRobots);\n"
+        variableHeader += f"    {typeCode} {member};\n"
+
+    for name in context.timedStages:
+        code += f"  m_StageTimings.push_back(StageTiming({json.dumps(name)}));\n"
+
+    initialisation = generateVariableInitialisation(variables, context, "init")
+
+    return initialisation + code, variableHeader
+
+
+def generateInstrumentationCode(context):
+    """
+    Code clearing the stage timings on reset, and code logging them after the experiment as a table of the total, mean
+    and max time per tick of each stage. Both are empty if the context does not instrument the stages.
+    """
+    if not context.timedStages:
+        return "", ""
+
+    width = max(len(name) for name in context.timedStages) + 2
+    reset = "for (StageTiming& timing: m_StageTimings)\n    timing.Clear();"
+    report = '\n  LOG << "Stage timings (ns per tick)" << std::endl;\n' \
+             f'  LOG << std::left << std::setw({width}) << "Stage" << std::right << std::setw(16) << "Total"' \
+             ' << std::setw(12) << "Mean" << std::setw(12) << "Max" << std::endl;\n' \
+             '  for (const StageTiming& timing: m_StageTimings) {\n' \
+             f'    LOG << std::left << std::setw({width}) << timing.Name << std::right << std::setw(16) << timing.Total\n' \
+             '        << std::setw(12) << (timing.Ticks ? timing.Total / timing.Ticks : 0) << std::setw(12) << timing.Max' \
+             ' << std::endl;\n' \
+             '  }'
+    return reset, report
 
 
 def generateRandomPositionFunctionCode(arena):
@@ -0,0 +1,401 @@
+"""
+NumPy evaluation of the objective stages, without generating the loop functions
+"""
+import numpy as np
+
+from src.models.objectiveUtils.stageParser import getStageParser
+from src.util import cleanIdentifier
+
+
+class UnsupportedFunctionError(ValueError):
+    """
+    Raised for a stage calling functions of the model without NumPy implementation.
+    """
+
+
+class NumpyEvaluator:
+    """
+    Evaluates StageNode trees with NumPy, with the semantics of the generated loop functions. A Pos is an array of 2
+    coordinates, a List[Pos] an (N, 2) array, and a List[Real] a vector. The lights are given as a dict of their ARGoS
+    id to their position.
+
+    The functions are implemented for each overload of the model, and fused functions are evaluated as the functions
+    they fuse.
+    """
+    def __init__(self, lights=None):
+        self.lights = {} if lights is None else lights
+        self.implementations = {
+            "sum": np.sum,
+            "mean": lambda values: np.mean(values) if len(values) else 0.0,
+            "min": lambda values: np.min(values) if len(values) else 0.0,
+            "max": lambda values: np.max(values) if len(values) else 0.0,
+            "variance": lambda values: np.var(values) if len(values) else 0.0,
+            "argmin": lambda values: float(np.argmin(values)) if len(values) else -1.0,
+            "dist 1-1": lambda pos1, pos2: np.linalg.norm(pos1 - pos2),
+            "dist N-1": lambda positions, pos: np.linalg.norm(positions - pos, axis=1),
+            "dist 1-N": lambda pos, positions: np.linalg.norm(positions - pos, axis=1),
+            "dist N-N": self.distPairs,
+            "dist NxN": lambda positions1, positions2:
+                np.linalg.norm(positions1[:, None, :] - positions2[None, :, :], axis=2).ravel(),
+            "count pos": lambda values: float(len(values)),
+            "count Real": lambda values: float(len(values)),
+            "closest": self.closestNeighbors,
+            "neighbors within": lambda positions, radius:
+                np.sum(self.squaredDistances(positions) <= radius * radius, axis=1) - 1.0,
+            "count within": lambda positions, radius:
+                (np.sum(self.squaredDistances(positions) <= radius * radius) - len(positions)) / 2.0,
+            "lightpos": self.lightPos,
+        }
+
+    def evaluate(self, node, variables):
+        """
+        Value of the tree, with the given values of its variables (model variables, init variables and previous
+        stages). The Update functions assign their variable in this dict.
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self.evaluateNode(node, variables)
+
+    def evaluateNode(self, node, variables):
+        if node.rule == "func":
+            return self.func(node, variables)
+        if node.rule == "var":
+            return variables[node.value]
+        if node.rule == "number":
+            return np.float64(node.value)
+        if node.rule == "string":
+            return node.value[1:-1]
+
+        values = [self.evaluateNode(child, variables) for child in node.children]
+        if node.rule == "neg":
+            return -values[0]
+        left, right = values
+        if node.rule == "add":
+            return left + right
+        if node.rule == "sub":
+            return left - right
+        if node.rule == "mul":
+            return left * right
+        if node.rule == "div":
+            return left / right
+        raise ValueError(f"Unknown rule {node.rule}")
+
+    def func(self, node, variables):
+        if node.data["name"].startswith("update"):
+            return self.update(node, variables)
+
+        arguments = [self.evaluateNode(child, variables) for child in node.children]
+        if "fuses" in node.data:
+            outer, inner = node.data["fuses"]
+            return self.call(outer, self.call(inner, *arguments))
+        return self.call(node.data["name"], *arguments)
+
+    def call(self, name, *arguments):
+        if name not in self.implementations:
+            raise UnsupportedFunctionError(f"No NumPy implementation of the function {name}")
+        return self.implementations[name](*arguments)
+
+    def getUnsupportedFunctions(self, node):
+        """
+        Names of the functions called in the tree (or fused by its functions) without implementation.
+        """
+        unsupported = set()
+        if node.rule == "func" and not node.data["name"].startswith("update"):
+            unsupported.update(name for name in node.data.get("fuses", [node.data["name"]])
+                               if name not in self.implementations)
+        for child in node.children:
+            unsupported.update(self.getUnsupportedFunctions(child))
+        return unsupported
+
+    def update(self, node, variables):
+        """
+        Update(subject, target) : assigns the target to the subject variable (element wise for lists), and returns 0.
+        """
+        subject, target = node.children
+        value = self.evaluateNode(target, variables)
+        if subject.valueType.startswith("List"):
+            current = np.array(variables[subject.value], dtype=float)
+            size = min(len(current), len(value))
+            current[:size] = value[:size]
+            value = current
+        variables[subject.value] = value
+        return 0.0
+
+    # ---- Functions ----
+
+    @staticmethod
+    def distPairs(positions1, positions2):
+        size = min(len(positions1), len(positions2))
+        return np.linalg.norm(positions1[:size] - positions2[:size], axis=1)
+
+    @staticmethod
+    def squaredDistances(positions):
+        """
+        Squared distances between every pair of positions of a list, or of each list of a batch (see BatchEvaluator).
+        """
+        x = positions[..., 0]
+        y = positions[..., 1]
+        squared = x[..., :, None] - x[..., None, :]
+        squared *= squared
+        dy = y[..., :, None] - y[..., None, :]
+        squared += dy * dy
+        return squared
+
+    def closestNeighbors(self, positions):
+        if len(positions) < 2:  # no other position : the neighbor is the origin
+            return np.zeros((len(positions), 2))
+        distances = self.squaredDistances(positions)
+        np.fill_diagonal(distances, np.inf)
+        return positions[np.argmin(distances, axis=1)]
+
+    def lightPos(self, name):
+        return np.asarray(self.lights[name], dtype=float)
+
+
+def getLightPositions(arena):
+    """
+    Positions (in m) of the lights of the arena, by their ARGoS id. See argos.generateArgosFile
+    """
+    if not arena.lights:
+        return {"light_0": (0.0, 0.0)}
+    coord_scale = arena.getCoordScale()
+    return {f"light_{i}": (light.x * coord_scale, light.y * coord_scale) for i, light in enumerate(arena.lights)}
+
+
+class BatchEvaluator(NumpyEvaluator):
+    """
+    Evaluates StageNode trees for many ticks at once : every value has a leading axis of the ticks (a List[Pos] is a
+    (T, N, 2) array), except the numbers and strings. Only trees without side effects can be evaluated this way (see
+    isBatchable), as the ticks are independent.
+
+    The functions comparing every pair of positions are evaluated by blocks of ticks, so that their arrays of
+    distances stay small enough for the processor cache.
+    """
+    pairwiseSize = 1 << 16  # elements of the arrays of pairwise distances computed at once
+
+    def __init__(self, lights=None):
+        super().__init__(lights)
+        self.ticks = 0
+        self.implementations.update({
+            "sum": lambda values: np.sum(values, axis=-1),
+            "mean": self.reduction(np.mean, 0.0),
+            "min": self.reduction(np.min, 0.0),
+            "max": self.reduction(np.max, 0.0),
+            "variance": self.reduction(np.var, 0.0),
+            "argmin": self.reduction(lambda values, axis: np.argmin(values, axis=axis).astype(float), -1.0),
+            "dist 1-1": lambda pos1, pos2: np.linalg.norm(pos1 - pos2, axis=-1),
+            "dist N-1": lambda positions, pos: np.linalg.norm(positions - pos[:, None, :], axis=-1),
+            "dist 1-N": lambda pos, positions: np.linalg.norm(positions - pos[:, None, :], axis=-1),
+            "dist NxN": lambda positions1, positions2:
+                np.linalg.norm(positions1[:, :, None, :] - positions2[:, None, :, :], axis=-1).reshape(self.ticks, -1),
+            "count pos": lambda values: np.full(self.ticks, float(values.shape[1])),
+            "count Real": lambda values: np.full(self.ticks, float(values.shape[1])),
+            "neighbors within": lambda positions, radius: self.byBlocks(
+                lambda block, squaredRadius: np.sum(self.squaredDistances(block) <= squaredRadius, axis=2) - 1.0,
+                positions, self.perTick(radius * radius)),
+            "count within": lambda positions, radius: self.byBlocks(
+                lambda block, squaredRadius:
+                    (np.sum(self.squaredDistances(block) <= squaredRadius, axis=(1, 2)) - block.shape[1]) / 2.0,
+                positions, self.perTick(radius * radius)),
+        })
+
+    def evaluateTicks(self, stageNodes, positions, members, stageTotals=None):
+        """
+        Sum over the ticks of the post step function, for the robots positions of each tick (T, N, 2). stageNodes are
+        (stage, StageNode or None) pairs, and members the values of the init variables. The sum of each stage value is
+        added to stageTotals, if given.
+        """
+        self.ticks = len(positions)
+        variables = {name: self.batch(value) for name, value in members.items()}
+        variables["robotsPos"] = positions
+        total = np.zeros(self.ticks)
+        for stage, stageNode in stageNodes:
+            stageVar = cleanIdentifier(stage.name)
+            variables[stageVar] = np.zeros(self.ticks)
+            if stageNode is not None:
+                variables[stageVar] = np.broadcast_to(self.evaluate(stageNode, variables), (self.ticks,))
+            if stageTotals is not None:
+                stageTotals[stage.name] = stageTotals.get(stage.name, 0.0) + float(np.sum(variables[stageVar]))
+            if stage.increment:
+                total += variables[stageVar]
+        return np.sum(total)
+
+    def batch(self, value):
+        """
+        Value repeated for each tick.
+        """
+        if isinstance(value, str):
+            return value
+        value = np.asarray(value, dtype=float)
+        return np.broadcast_to(value, (self.ticks,) + value.shape)
+
+    def perTick(self, value):
+        """
+        Real value (repeated or by tick) shaped to be compared with (T, N, N) arrays.
+        """
+        return np.reshape(np.broadcast_to(value, (self.ticks,)), (self.ticks, 1, 1))
+
+    def reduction(self, function, empty):
+        return lambda values: function(values, axis=-1) if values.shape[-1] else np.full(self.ticks, empty)
+
+    @staticmethod
+    def distPairs(positions1, positions2):
+        size = min(positions1.shape[1], positions2.shape[1])
+        return np.linalg.norm(positions1[:, :size] - positions2[:, :size], axis=-1)
+
+    def byBlocks(self, function, positions, *arguments):
+        """
+        Concatenation of the function results on blocks of ticks of the positions (and of the other arguments, given
+        by tick), of at most pairwiseSize pairs of positions.
+        """
+        block = max(1, self.pairwiseSize // max(1, positions.shape[1] ** 2))
+        return np.concatenate([function(positions[start:start + block], *(a[start:start + block] for a in arguments))
+                               for start in range(0, len(positions), block)])
+
+    def closestNeighbors(self, positions):
+        if positions.shape[1] < 2:  # no other position : the neighbor is the origin
+            return np.zeros(positions.shape)
+        return self.byBlocks(self.closestNeighborsBlock, positions)
+
+    def closestNeighborsBlock(self, positions):
+        distances = self.squaredDistances(positions)
+        diagonal = np.arange(positions.shape[1])
+        distances[:, diagonal, diagonal] = np.inf
+        closest = np.argmin(distances, axis=2)
+        return np.take_along_axis(positions, closest[:, :, None], axis=1)
+
+    def lightPos(self, name):
+        return self.batch(super().lightPos(name))
+
+
+def isBatchable(stageNode):
+    """
+    Whether the value of the tree on a tick does not depend on the previous ticks : it has no side effects (Update),
+    and does not read the objective value.
+    """
+    return stageNode.pure and "objective" not in stageNode.getNames()
+
+
+def checkSupported(objective, evaluator, parser):
+    """
+    Raises an UnsupportedFunctionError if a stage of the objective calls functions the evaluator does not implement, so
+    that it fails before evaluating any tick.
+    """
+    for role, stages in (("init", objective.initStages), ("postStep", objective.postStepStages),
+                         ("postExp", objective.postExpStages)):
+        for stage in stages:
+            if stage.code:
+                unsupported = evaluator.getUnsupportedFunctions(parser.parseStage(stage.code, role))
+                if unsupported:
+                    raise UnsupportedFunctionError(f"No NumPy implementation of the functions "
+                                                   f"{', '.join(sorted(unsupported))} of the stage {stage.name}")
+
+
+def evaluateObjective(objective, positions, lights=None, parser=None, stageTotals=None):
+    """
+    Final value of the objective, for the positions of the robots after each tick of an experiment (arrays of shape
+    (N, 2)), as computed by the generated loop functions. The init stages are evaluated with the first positions.
+    Raises an UnsupportedFunctionError if the objective calls functions without NumPy implementation.
+
+    If given, the stageTotals dict is filled with the sum of the values of each post step stage over the evaluated
+    ticks (rescaled as the objective value).
+    """
+    parser = getStageParser() if parser is None else parser
+    evaluator = NumpyEvaluator(lights)
+    checkSupported(objective, evaluator, parser)
+    members = {}
+    objectiveValue = 0.0
+    period = max(1, int(objective.evaluationPeriod))
+    scale = period if objective.rescaleEvaluation else 1
+    totals = {stage.name: 0.0 for stage in objective.postStepStages}
+
+    for tick, tickPositions in enumerate(positions, 1):
+        tickPositions = np.asarray(tickPositions, dtype=float)
+        if tick == 1:
+            members = evaluateInitStages(objective.initStages, tickPositions, evaluator, parser)
+        if tick % period == 0:
+            members.update({"robotsPos": tickPositions, "objective": objectiveValue})
+            objectiveValue += scale * evaluateStages(objective.postStepStages, "postStep", evaluator, parser, members,
+                                                     totals)
+
+    if stageTotals is not None:
+        stageTotals.update({name: scale * total for name, total in totals.items()})
+    return evaluatePostExpStages(objective.postExpStages, objectiveValue, evaluator, parser, members)
+
+
+def evaluateTrajectory(objective, trajectory, lights=None, chunkSize=None, parser=None, stageTotals=None):
+    """
+    Same as evaluateObjective for a trajectory of shape (T, N, 2), with the post step stages evaluated for all the
+    ticks at once. With a chunkSize, the ticks are evaluated by chunks of at most that many ticks, which bounds the
+    memory used : the trajectory can then be a memory mapped array.
+
+    The ticks of objectives whose post step stages have side effects or read the objective value depend on each other,
+    so they are evaluated one by one.
+    """
+    parser = getStageParser() if parser is None else parser
+    stageNodes = [(stage, parser.parseStage(stage.code, "postStep") if stage.code else None)
+                  for stage in objective.postStepStages]
+    if len(trajectory) == 0 or not all(node is None or isBatchable(node) for _, node in stageNodes):
+        return evaluateObjective(objective, trajectory, lights, parser, stageTotals)
+
+    evaluator = NumpyEvaluator(lights)
+    batchEvaluator = BatchEvaluator(lights)
+    checkSupported(objective, batchEvaluator, parser)
+    period = max(1, int(objective.evaluationPeriod))
+    scale = period if objective.rescaleEvaluation else 1
+
+    members = evaluateInitStages(objective.initStages, np.asarray(trajectory[0], dtype=float), evaluator, parser)
+    evaluatedTicks = trajectory[period - 1::period]
+    chunkSize = len(evaluatedTicks) if chunkSize is None else max(1, chunkSize)
+    objectiveValue = 0.0
+    totals = {stage.name: 0.0 for stage in objective.postStepStages}
+    for start in range(0, len(evaluatedTicks), chunkSize):
+        positions = np.asarray(evaluatedTicks[start:start + chunkSize], dtype=float)
+        objectiveValue += scale * batchEvaluator.evaluateTicks(stageNodes, positions, members, totals)
+
+    if stageTotals is not None:
+        stageTotals.update({name: scale * total for name, total in totals.items()})
+
+    return evaluatePostExpStages(objective.postExpStages, objectiveValue, evaluator, parser, members)
+
+
+def evaluateInitStages(stages, positions, evaluator, parser):
+    """
+    Members of the loop functions after Init : the variables of the init stages, evaluated with the given positions.
+    """
+    members = {"robotsPos": positions, "objective": 0.0}
+    for stage in stages:
+        if stage.code:
+            members[cleanIdentifier(stage.name)] = evaluator.evaluate(parser.parseStage(stage.code, "init"), members)
+    return members
+
+
+def evaluatePostExpStages(stages, objectiveValue, evaluator, parser, members):
+    """
+    Final objective value, modified by the post experiment stages if at least one of them counts.
+    """
+    if any(stage.increment for stage in stages):
+        members["objective"] = objectiveValue
+        objectiveValue = evaluateStages(stages, "postExp", evaluator, parser, members)
+    return float(objectiveValue)
+
+
+def evaluateStages(stages, role, evaluator, parser, members, stageTotals=None):
+    """
+    Sum of the stages counting in the function, as in generateStageCode. The stage values are local to the function,
+    while the Update functions modify the members. The value of each stage is added to stageTotals, if given.
+    """
+    variables = dict(members)
+    total = 0.0
+    for stage in stages:
+        stageVar = cleanIdentifier(stage.name)
+        variables[stageVar] = 0.0
+        if stage.code:
+            variables[stageVar] = evaluator.evaluate(parser.parseStage(stage.code, role), variables)
+        if stageTotals is not None:
+            stageTotals[stage.name] = stageTotals.get(stage.name, 0.0) + float(variables[stageVar])
+        if stage.increment:
+            total += variables[stageVar]
+
+    for name in members:  # Update of members
+        members[name] = variables[name]
+    return total
@@ -2,36 +2,175 @@
 Stage Code Parser
 """
 import json
+import math
+import operator
+import threading
+from collections import OrderedDict
 from lark import Lark, Transformer
 
-from src.util import ResourceLoader
+from src.util import ResourceLoader, contentHash
 
 
 class StageParser(Lark):
-    def __init__(self, functionPath, grammarPath, **options):
+    """
+    LALR parser for the stage code, transforming it into StageNode trees.
 
-        with ResourceLoader.openData(functionPath) as functionFile:
-            functionData = json.load(functionFile)
+    The parsing tables are cached to disk, in a file keyed by the paths and the hash of the grammar and model files. A
+    stale cache file is thus never loaded : it is rebuilt (and the old ones of the same files are removed) whenever one
+    of these files changes.
+    """
+    cachePrefix = "stage_parser_"
 
-        with ResourceLoader.openData(grammarPath) as grammarFile:
-            grammar = grammarFile.read()
+    def __init__(self, functionPath, grammarPath, useCache=True, optimize=True, **options):
+        functionSource = ResourceLoader.readData(functionPath)
+        grammar = ResourceLoader.readData(grammarPath)
 
-        self.transformer = CppTransformer(functionData)
+        self.sourceHash = contentHash(grammar, functionSource)
+        if useCache and "cache" not in options:
+            options["cache"] = self.getCachePath(functionPath, grammarPath, self.sourceHash)
+
+        self.transformer = CppTransformer(json.loads(functionSource))
+        self.rewriters = [ConstantFolder(), KernelFuser(self.transformer.fusions)] if optimize else []
         super().__init__(grammar, parser='lalr', transformer=self.transformer, **options)
 
+    @classmethod
+    def getCachePath(cls, functionPath, grammarPath, sourceHash):
+        """
+        Path of the cache file for the given model and grammar files and their sources. Cache files of other sources of
+        the same files are removed, as they are stale, while those of parsers of other files are kept.
+        """
+        pathHash = contentHash(functionPath, grammarPath)[:16]
+        return ResourceLoader.getCachePath(f"{cls.cachePrefix}{pathHash}_{sourceHash}.lark",
+                                           stalePrefix=f"{cls.cachePrefix}{pathHash}_")
+
+    def parseStage(self, code, role):
+        """
+        Parses the code of a stage with the given role (postStep, postExp or init) into a StageNode tree. The trees are
+        optimized by the parser rewriters, and memoized in the stage cache, keyed by the code, the role, the hash of the
+        model and grammar files and whether the parser optimizes.
+        """
+        key = (self.sourceHash, bool(self.rewriters), role, code)
+        stageNode = stageCache.get(key)
+        if stageNode is None:
+            stageNode = self.parse(code)
+            for rewriter in self.rewriters:
+                stageNode = rewriter.rewrite(stageNode)
+            stageCache.put(key, stageNode)
+        return stageNode
+
     def getFunctions(self):
         return self.transformer.functions
 
+    def getFusions(self):
+        return self.transformer.fusions
+
+    def getHelpers(self):
+        return self.transformer.helpers
+
     def getVariables(self):
         return self.transformer.variables
 
     def getTypes(self):
         return self.transformer.types
 
+    def getListTypes(self):
+        return self.transformer.listTypes
+
+    def getElementSizes(self):
+        return self.transformer.elementSizes
+
+
+_parsers = {}
+_parsersLock = threading.Lock()
+
+
+def getStageParser(functionPath="objective_model.json", grammarPath="objective_grammar.lark"):
+    """
+    Parser shared by every generation of the process, created on first use. The parser itself holds no state of a
+    generation (see CompilationContext), so it can be used by several threads at once.
+    """
+    with _parsersLock:
+        key = (functionPath, grammarPath)
+        if key not in _parsers:
+            _parsers[key] = StageParser(functionPath, grammarPath)
+        return _parsers[key]
+
+
+class CompilationContext:
+    """
+    State of the compilation of one objective : the functions and model variables used by its stages, the
+    computations hoisted out of the post step, the member buffers and the timed stages. Each generation has its own
+    context, so that objectives can be compiled concurrently with the same parser.
+    """
+    def __init__(self, parser, memberBuffers=False, instrument=False):
+        self.parser = parser
+        self.types = parser.getTypes()
+        self.listTypes = parser.getListTypes()
+        self.functions = set()
+        self.variables = set()
+        self.hoister = InvariantHoister()
+        self.memberBuffers = memberBuffers
+        self.buffers = []  # (member name, type code) of the member buffers used by the post step
+        self.instrument = instrument
+        self.timedStages = []  # names of the stages timed by the instrumentation, by index
+
+    def parseStage(self, code, role):
+        """
+        Parses the code of a stage (see StageParser.parseStage) and registers the symbols it uses. The invariant
+        computations of the post step stages are hoisted (see getHoisted).
+        """
+        stageNode = self.parser.parseStage(code, role)
+        self.functions.update(stageNode.getFunctions())
+        self.variables.update(stageNode.getVariables())
+        if role == "postStep":
+            stageNode = self.hoister.rewrite(stageNode)
+        return stageNode
+
+    def getHoisted(self):
+        """
+        Computations hoisted out of the post step stages, as a list of (member name, StageNode).
+        """
+        return self.hoister.getHoisted()
+
+    def createGenerator(self, role):
+        """
+        Code generator for a new function of the loop functions, with its own temporary variables.
+        """
+        return CppGenerator(self.types, self.listTypes, self.getBuffers(role))
+
+    def getBuffers(self, role):
+        """
+        List in which the member buffers of the lists computed by the stages of the given role are registered, or None
+        if these lists are local variables. Only the post step, computed on every tick, uses member buffers.
+        """
+        if self.memberBuffers and role == "postStep":
+            return self.buffers
+        return None
+
+    def addTimedStage(self, name):
+        """
+        Registers a stage timed by the instrumentation, and returns its index in the timings member.
+        """
+        self.functions.add("stage timing")
+        self.timedStages.append(name)
+        return len(self.timedStages) - 1
+
+    def getFunctionData(self):
+        """
+        Data of every function of the model that can be generated, including the helpers and the fused functions.
+        """
+        return list(self.parser.getHelpers().values()) + list(self.parser.getFunctions().values()) + \
+            list(self.parser.getFusions().values())
+
+    def getVariableData(self):
+        return self.parser.getVariables()
 
-class CppTransformer(Transformer):
-    tempVarIndex = 0
 
+class CppTransformer(Transformer):
+    """
+    Transforms the parsed stage code into a StageNode tree, resolving the types, variables and functions from the
+    objective model. The C++ code itself is generated from the tree by a CppGenerator.
+    """
     def __init__(self, data):
         super().__init__()
         self.retrieveData(data)
@@ -40,6 +179,10 @@ class CppTransformer(Transformer):
         self.variables = {v["name"]: v for v in data["variables"]}
         self.functions = {self.getKeyFromFunction(f["call"], f["arguments"]): f for f in data["functions"]}
         self.types = {t["name"]: t["code"] for t in data["types"]}
+        self.listTypes = {t["name"] for t in data["types"] if t.get("list", False)}
+        self.elementSizes = {t["name"]: t["elementSize"] for t in data["types"] if "elementSize" in t}  # in bytes
+        self.fusions = {tuple(f["fuses"]): f for f in data.get("fusions", [])}
+        self.helpers = {h["name"]: h for h in data.get("helpers", [])}
 
     # ------------ Rules ----------------
     # ---- Functions ----
@@ -48,21 +191,7 @@ class CppTransformer(Transformer):
         function, arguments = children
         funcKey = self.getKeyFromFunction(function, [arg.valueType for arg in arguments])
         data = self.functions[funcKey]  # TODO : key check
-        returnType = data["return"]
-
-        argCode = ""
-        first = True
-        for arg in arguments:
-            if not first:
-                argCode += ", "
-            first = False
-            argCode += arg.instruction
-
-        tempVar = self.createTempVar()
-        code = self.getCode(*arguments)
-        code += f"  {self.types[returnType]} {tempVar} = {function}({argCode});\n"
-
-        return StageNode("func", returnType, value=function, children=arguments, data=data, instruction=tempVar, code=code)
+        return StageNode("func", data["return"], value=str(function), children=arguments, data=data)
 
     def args(self, arguments):
         return arguments
@@ -80,45 +209,34 @@ class CppTransformer(Transformer):
     def var(self, v):
         (v,) = v
         data = self.variables.get(v, {"name": "None", "type": "Pos"})   # TODO : look if defined in table of var and get its data
-        return StageNode("var", data["type"], value=v, instruction=v, data=data)
+        return StageNode("var", data["type"], value=str(v), instruction=str(v), data=data)
 
     # ---- Operations ----
 
     def add(self, children):
-        return self.operation("add", "+", children)
+        return self.operation("add", children)
 
     def sub(self, children):
-        return self.operation("sub", "-", children)
+        return self.operation("sub", children)
 
     def mul(self, children):
-        return self.operation("mul", "*", children)
+        return self.operation("mul", children)
 
     def div(self, children):
-        return self.operation("div", "/", children)
+        return self.operation("div", children)
 
     def neg(self, v):
         (v,) = v
-        valueType = v.valueType
-        code = self.getCode(v)
-        instruction = f"-{v.instruction}"
-        return StageNode("neg", valueType, children=[v], code=code, instruction=instruction)
+        return StageNode("neg", v.valueType, children=[v])
 
-    def operation(self, name, operator, children):
+    @staticmethod
+    def operation(name, children):
         left, right = children
         valueType = left.valueType
         # verify types are the same
-        code = self.getCode(left, right)
-        instruction = f"({left.instruction} {operator} {right.instruction})"
-        return StageNode(name, valueType, children=children, code=code, instruction=instruction)
+        return StageNode(name, valueType, children=children)
 
     # ------------ Utils ----------------
-    @staticmethod
-    def getCode(*args):
-        code = ""
-        for arg in args:
-            if arg.code:
-                code += arg.code
-        return code
 
     @staticmethod
     def getKeyFromFunction(function, arguments):
@@ -127,14 +245,299 @@ class CppTransformer(Transformer):
             key += "_" + arg
         return key
 
+
+class TreeRewriter:
+    """
+    Base of the passes rewriting StageNode trees, from the leaves to the root. The method named after the rule of a
+    node (if any) is called with the node, whose children are already rewritten, and returns its replacement.
+    Trees are never modified in place, as they may be shared by the stage cache.
+    """
+    def rewrite(self, node):
+        children = [self.rewrite(child) for child in node.children]
+        if any(new is not old for new, old in zip(children, node.children)):
+            node = node.withChildren(children)
+
+        method = getattr(self, node.rule, None)
+        return node if method is None else method(node)
+
+
+class ConstantFolder(TreeRewriter):
+    """
+    Computes the operations on constants, and simplifies the identities (x + 0, x - 0, x * 1, x * -1, x / 1, - -x).
+    """
+    def add(self, node):
+        left, right = node.children
+        if self.isNumber(left, 0):
+            return right
+        if self.isNumber(right, 0):
+            return left
+        return self.fold(node, operator.add)
+
+    def sub(self, node):
+        left, right = node.children
+        if self.isNumber(right, 0):
+            return left
+        if self.isNumber(left, 0):
+            return self.neg(StageNode("neg", right.valueType, children=[right]))
+        return self.fold(node, operator.sub)
+
+    def mul(self, node):
+        left, right = node.children
+        if self.isNumber(left, 1):
+            return right
+        if self.isNumber(right, 1):
+            return left
+        if self.isNumber(left, -1):
+            return self.neg(StageNode("neg", right.valueType, children=[right]))
+        if self.isNumber(right, -1):
+            return self.neg(StageNode("neg", left.valueType, children=[left]))
+        return self.fold(node, operator.mul)
+
+    def div(self, node):
+        left, right = node.children
+        if self.isNumber(right, 1):
+            return left
+        if self.isNumber(right, 0):  # left to the runtime
+            return node
+        return self.fold(node, operator.truediv)
+
+    def neg(self, node):
+        (child, ) = node.children
+        if child.rule == "neg":
+            return child.children[0]
+        if child.rule == "number":
+            instruction = child.instruction[1:] if child.instruction.startswith("-") else f"-{child.instruction}"
+            return StageNode("number", "Real", value=-child.value, instruction=instruction)
+        return node
+
     @classmethod
-    def createTempVar(cls):
-        cls.tempVarIndex += 1
-        return f"tempVar_{cls.tempVarIndex}"
+    def fold(cls, node, function):
+        left, right = node.children
+        if not (cls.isNumber(left) and cls.isNumber(right)):
+            return node
+
+        value = function(left.value, right.value)
+        if not math.isfinite(value):
+            return node
+        return StageNode("number", "Real", value=value, instruction=repr(value))
+
+    @staticmethod
+    def isNumber(node, value=None):
+        return node.rule == "number" and (value is None or node.value == value)
+
+
+class KernelFuser(TreeRewriter):
+    """
+    Replaces the reduction of a list computed by another function (such as Sum(Dist(...))) by the fused function
+    declared in the model, which computes the result in a single loop without allocating the intermediate list.
+    """
+    def __init__(self, fusions):
+        self.fusions = fusions  # (reduction name, inner function name) -> fused function data
+
+    def func(self, node):
+        if len(node.children) != 1 or node.children[0].rule != "func":
+            return node
+
+        (inner, ) = node.children
+        data = self.fusions.get((node.data["name"], inner.data["name"]))
+        if data is None:
+            return node
+        return StageNode("func", data["return"], value=data["call"], children=inner.children, data=data)
+
+
+class InvariantHoister(TreeRewriter):
+    """
+    Replaces the function calls giving the same value on every tick by member variables, computed once in Init.
+    The largest invariant subtrees are hoisted, and identical ones share the same member.
+    """
+    def __init__(self):
+        self.hoisted = {}  # key of the hoisted subtree -> (member name, subtree)
+
+    def rewrite(self, node):
+        if node.rule == "func" and node.invariant:
+            return self.hoist(node)
+        return super().rewrite(node)
+
+    def hoist(self, node):
+        if node.key not in self.hoisted:
+            self.hoisted[node.key] = (f"m_InvariantVar_{len(self.hoisted) + 1}", node)
+        member = self.hoisted[node.key][0]
+        data = {"name": member, "type": node.valueType, "invariant": True}
+        return StageNode("var", node.valueType, value=member, instruction=member, data=data)
+
+    def getHoisted(self):
+        """
+        List of the hoisted subtrees, with the name of their member.
+        """
+        return list(self.hoisted.values())
+
+
+class CppGenerator:
+    """
+    Generates the C++ code of StageNode trees. Each function call result is stored in a new temporary variable,
+    numbered from the creation of the generator.
+
+    Common subexpressions are eliminated : a pure function call structurally identical to one already generated
+    reuses its temporary variable, as long as none of the variables it depends on has been assigned in between.
+
+    Functions computing a list fill a vector given as last argument. If a buffers list is given, these vectors are
+    references to member buffers (registered in the list), so that their memory is reused from one call to the next.
+    """
+    operators = {"add": "+", "sub": "-", "mul": "*", "div": "/"}
+
+    def __init__(self, types, listTypes, buffers=None):
+        self.types = types
+        self.listTypes = listTypes
+        self.buffers = buffers
+        self.tempVarIndex = 0
+        self.computed = {}  # key of a generated pure call -> (temporary variable, names it depends on)
+
+    def generate(self, node):
+        """
+        Returns the code computing the node (declaring its temporary variables), and the instruction giving its value.
+        """
+        if node.rule == "func":
+            return self.func(node)
+        if node.rule == "neg":
+            return self.neg(node)
+        if node.rule in self.operators:
+            return self.operation(node)
+        return "", node.instruction
+
+    def generateAssignment(self, node, target):
+        """
+        Code computing the node and assigning its value to the target variable.
+        """
+        code, instruction = self.generate(node)
+        self.invalidate(target)
+        return code + f"  {target} = {instruction};\n"
+
+    def invalidate(self, name):
+        """
+        Forgets the generated calls depending on a variable, when its value changes.
+        """
+        self.computed = {key: value for key, value in self.computed.items() if name not in value[1]}
+
+    def func(self, node):
+        if node.pure and node.key in self.computed:
+            return "", self.computed[node.key][0]
+
+        code, argInstructions = self.generateChildren(node)
+        tempVar = self.createTempVar()
+        if node.valueType in self.listTypes:
+            code += self.declareList(tempVar, self.types[node.valueType])
+            code += f"  {node.value}({', '.join(argInstructions + [tempVar])});\n"
+        else:
+            code += f"  {self.types[node.valueType]} {tempVar} = {node.value}({', '.join(argInstructions)});\n"
+
+        if node.pure:
+            self.computed[node.key] = (tempVar, node.getNames())
+        else:  # the call may modify any variable
+            self.computed.clear()
+        return code, tempVar
+
+    def declareList(self, name, typeCode):
+        """
+        Declaration of a list variable, as a local vector or as a reference to a member buffer.
+        """
+        if self.buffers is None:
+            return f"  {typeCode} {name};\n"
+
+        member = f"m_Buffer_{name}"
+        self.buffers.append((member, typeCode))
+        return f"  {typeCode}& {name} = {member};\n"
+
+    def neg(self, node):
+        code, (instruction, ) = self.generateChildren(node)
+        if instruction.startswith("-"):  # not a decrement
+            instruction = f"({instruction})"
+        return code, f"-{instruction}"
+
+    def operation(self, node):
+        code, (left, right) = self.generateChildren(node)
+        return code, f"({left} {self.operators[node.rule]} {right})"
+
+    def generateChildren(self, node):
+        code = ""
+        instructions = []
+        for child in node.children:
+            childCode, instruction = self.generate(child)
+            code += childCode
+            instructions.append(instruction)
+        return code, instructions
+
+    def createTempVar(self):
+        self.tempVarIndex += 1
+        return f"tempVar_{self.tempVarIndex}"
+
+
+class StageCache:
+    """
+    Least recently used cache of the StageNode trees parsed from the stages code, shared between generations (and
+    threads). The hits and misses are counted to monitor its efficiency.
+    """
+    def __init__(self, maxSize=256):
+        self.maxSize = maxSize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the tree stored for the key, or None if there is none.
+        """
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, node):
+        with self.lock:
+            self.entries[key] = node
+            self.entries.move_to_end(key)
+            self.trim()
+
+    def setMaxSize(self, maxSize):
+        """
+        Sets the maximum number of trees in the cache. A size of 0 disables the cache.
+        """
+        with self.lock:
+            self.maxSize = maxSize
+            self.trim()
+
+    def trim(self):
+        while len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def getStats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self.entries),
+                "maxSize": self.maxSize,
+            }
+
+
+stageCache = StageCache()
 
 
 class StageNode:
-    def __init__(self, rule, valueType, value=None, children=None, data=None, instruction=None, code=None):
+    """
+    Node of a parsed stage. Trees may be shared through the stage cache, so they must not be modified once built.
+    """
+    def __init__(self, rule, valueType, value=None, children=None, data=None, instruction=None):
         self.rule = rule  # (var, number, func, ...)
         self.valueType = valueType  # type of return (Real, Pos, List)
         self.value = value  # if string or number, raw value
@@ -147,10 +550,21 @@ class StageNode:
             data = {}
         self.data = data
 
-        self.code = code  # generated code so far for the stage
         if instruction is None:
             instruction = str(value)
-        self.instruction = instruction  # current instruction
+        self.instruction = instruction  # instruction of a value node
+
+        # structural identity of the subtree, and whether it is free of side effects
+        self.key = (rule, valueType, value if children else instruction, tuple(child.key for child in children))
+        self.pure = all(child.pure for child in children) and (rule != "func" or data.get("pure", False))
+        self.invariant = self.pure and all(child.invariant for child in children) and \
+            (rule not in ("func", "var") or data.get("invariant", False))  # same value on every tick
+
+    def withChildren(self, children):
+        """
+        Copy of the node with other children.
+        """
+        return StageNode(self.rule, self.valueType, self.value, children, self.data, self.instruction)
 
     def getVariables(self):
         variables = set()
@@ -160,18 +574,28 @@ class StageNode:
             variables.update(child.getVariables())
         return variables
 
+    def getNames(self):
+        """
+        Names of the variables (from the model or user defined) used in the subtree.
+        """
+        names = set()
+        if self.rule == "var":
+            names.add(self.value)
+        for child in self.children:
+            names.update(child.getNames())
+        return names
+
     def getFunctions(self):
+        """
+        Names of the functions (overloads of the model) called in the subtree.
+        """
         functions = set()
         if self.rule == "func":
-            functions.add(self.data["call"])
+            functions.add(self.data["name"])
         for child in self.children:
             functions.update(child.getFunctions())
         return functions
 
-    def assignToStage(self, stage):
-        self.code += f"  {stage} = {self.instruction};\n"
-        self.instruction = stage
-
     def __str__(self):
         out = f"StageNode({self.rule}, {self.valueType}, {self.value})"
         for child in self.children:
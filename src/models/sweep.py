@@ -0,0 +1,209 @@
+"""
+Parameter sweeps : generation of the .argos files of every combination of the swept parameters of a mission
+
+Usage : python -m src.models.sweep sweep.json [workers]
+
+The sweep file gives the mission file, the output folder (both relative to the sweep file) and the values of each
+swept parameter, for instance :
+{
+  "mission": "mission.json",
+  "output": "sweep",
+  "parameters": {"robotNumber": [10, 20], "randomSeed": [0, 1, 2], "length": [60, 120], "sideLength": [100, 200]}
+}
+The loop functions are generated with the options of an optional "loopFunctions" entry (as {"parallel": true}).
+
+The generated files are content addressed : each .argos file and each loop functions folder is stored under the hash of
+the inputs it depends on, in the objects folder of the output folder, and is only generated if it is not there yet. The
+variants whose loop functions are the same (as the variants which only change the experiment or the robots number)
+share one loop functions folder, to build once. Each variant also has a .argos file named after its parameters, linked
+to its stored file, next to the floor images they reference, and a manifest.json file lists the variants with their
+parameters, .argos file and loop functions folder.
+"""
+import copy
+import itertools
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from src.models.argos import generateArgosFile, getArgosFileKey
+from src.models.floorImage import imagePrefix
+from src.models.mission import loadMission
+from src.models.objectiveUtils.loopFunctions import generateLoopFunctions, getLoopFunctionsKey
+from src.util import cleanIdentifier, replaceFile
+
+# parameters of the .argos experiment, given as options of generateArgosFile
+frameworkParameters = ("randomSeed", "length")
+# parameters of the arena of the mission
+arenaParameters = ("robotNumber", "sideLength", "shape")
+
+manifestName = "manifest.json"
+argosObjects = os.path.join("objects", "argos")
+loopFunctionsObjects = os.path.join("objects", "loop-functions")
+
+# mission and options of a worker process, set once by initWorker
+worker = {}
+
+
+class Sweep:
+    """
+    Sweep of a mission over the values of its parameters.
+    """
+    def __init__(self, data, folder=""):
+        self.missionPath = os.path.join(folder, data["mission"])
+        self.outputFolder = os.path.join(folder, data.get("output", "sweep"))
+        self.parameters = {name: list(values) for name, values in data.get("parameters", {}).items()}
+        self.loopFunctionsOptions = data.get("loopFunctions", {})
+
+        unknown = set(self.parameters) - set(frameworkParameters + arenaParameters)
+        if unknown:
+            raise ValueError(f"Unknown sweep parameters {', '.join(sorted(unknown))}, "
+                             f"the parameters are {', '.join(frameworkParameters + arenaParameters)}")
+
+    def getVariants(self):
+        """
+        Parameters of each variant : the cartesian product of the values of the parameters.
+        """
+        names = list(self.parameters)
+        return [dict(zip(names, values)) for values in itertools.product(*self.parameters.values())]
+
+    def __len__(self):
+        count = 1
+        for values in self.parameters.values():
+            count *= len(values)
+        return count
+
+
+def loadSweep(path):
+    with open(path, 'r') as sweepFile:
+        return Sweep(json.load(sweepFile), os.path.dirname(path))
+
+
+def getVariantName(variant):
+    return "_".join(f"{name}-{value}" for name, value in variant.items()) or "default"
+
+
+def getVariantMission(mission, variant):
+    """
+    Copy of the mission with the arena parameters of the variant (the other objects of the mission are shared).
+    """
+    mission = copy.copy(mission)
+    mission.arena = copy.copy(mission.arena)
+    mission.arena.loadFromData({name: value for name, value in variant.items() if name in arenaParameters})
+    return mission
+
+
+def getArgosOptions(variant, source):
+    return {"source": source, **{name: value for name, value in variant.items() if name in frameworkParameters}}
+
+
+def initWorker(missionPath, loopFunctionsOptions):
+    worker["mission"] = loadMission(missionPath)
+    worker["source"] = os.path.basename(missionPath)
+    worker["loopFunctionsOptions"] = loopFunctionsOptions
+
+
+def generateObject(job):
+    """
+    Generates a stored file of a variant of the worker mission, given as a (kind, path, parameters) job : the .argos
+    file at the path, or the loop functions in the folder at the path. The file is generated under a temporary name
+    then renamed, so that an interrupted generation does not leave an incomplete object.
+    """
+    kind, path, variant = job
+    mission = getVariantMission(worker["mission"], variant)
+
+    def write(temporaryPath):
+        if kind == "argos":
+            generateArgosFile(mission, temporaryPath, **getArgosOptions(variant, worker["source"]))
+        else:
+            os.makedirs(temporaryPath)
+            fileName = f"{cleanIdentifier(mission.objective.name)}LoopFunc.cpp"  # as included by the generated code
+            generateLoopFunctions(mission, os.path.join(temporaryPath, fileName),
+                                  source=worker["source"], **worker["loopFunctionsOptions"])
+
+    try:
+        replaceFile(path, write)
+    except OSError:
+        if not os.path.exists(path):  # else stored meanwhile by another sweep
+            raise
+    return path
+
+
+def linkFile(source, destination):
+    """
+    Hard links the destination to the source file, or copies it if the file system cannot link it.
+    """
+    if os.path.lexists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+def generateSweep(sweep, maxWorkers=None):
+    """
+    Generates the .argos files and loop functions of the variants of the sweep that are not stored yet, in a process
+    pool, links the .argos file of each variant and writes the manifest. Returns the manifest.
+    """
+    mission = loadMission(sweep.missionPath)
+    source = os.path.basename(sweep.missionPath)
+    for folder in (argosObjects, loopFunctionsObjects):
+        os.makedirs(os.path.join(sweep.outputFolder, folder), exist_ok=True)
+
+    entries, jobs = [], {}
+    for variant in sweep.getVariants():
+        variantMission = getVariantMission(mission, variant)
+        argosKey = getArgosFileKey(variantMission, **getArgosOptions(variant, source))
+        loopFunctionsKey = getLoopFunctionsKey(variantMission, source=source, **sweep.loopFunctionsOptions)
+        argosPath = os.path.join(argosObjects, f"{argosKey}.argos")
+        loopFunctionsPath = os.path.join(loopFunctionsObjects, loopFunctionsKey)
+        for kind, path in (("argos", argosPath), ("loopFunctions", loopFunctionsPath)):
+            if path not in jobs and not os.path.exists(os.path.join(sweep.outputFolder, path)):
+                jobs[path] = (kind, os.path.join(sweep.outputFolder, path), variant)
+        entries.append({"file": f"{getVariantName(variant)}.argos", "argos": argosPath,
+                        "loopFunctions": loopFunctionsPath, **variant})
+
+    if jobs:
+        maxWorkers = maxWorkers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=maxWorkers, initializer=initWorker,
+                                 initargs=(sweep.missionPath, sweep.loopFunctionsOptions)) as executor:
+            for _ in executor.map(generateObject, jobs.values(), chunksize=max(1, len(jobs) // (4 * maxWorkers))):
+                pass
+
+    for entry in entries:
+        linkFile(os.path.join(sweep.outputFolder, entry["argos"]), os.path.join(sweep.outputFolder, entry["file"]))
+    # floor images, referenced by the .argos files from their folder
+    for name in os.listdir(os.path.join(sweep.outputFolder, argosObjects)):
+        if name.startswith(imagePrefix) and not os.path.exists(os.path.join(sweep.outputFolder, name)):
+            linkFile(os.path.join(sweep.outputFolder, argosObjects, name), os.path.join(sweep.outputFolder, name))
+
+    manifest = {
+        "mission": os.path.abspath(sweep.missionPath),
+        "parameters": sweep.parameters,
+        "generated": len(jobs),
+        "loopFunctions": sorted({entry["loopFunctions"] for entry in entries}),
+        "variants": entries,
+    }
+    with open(os.path.join(sweep.outputFolder, manifestName), 'w') as manifestFile:
+        json.dump(manifest, manifestFile, indent=2)
+    return manifest
+
+
+def main(sweepPath, maxWorkers=None):
+    sweep = loadSweep(sweepPath)
+    start = time.perf_counter()
+    manifest = generateSweep(sweep, maxWorkers)
+    duration = time.perf_counter() - start
+    print(f"{len(sweep)} variants with {len(manifest['loopFunctions'])} loop functions to build, "
+          f"{manifest['generated']} files generated in {duration:.2f} s ({len(sweep) / duration:,.0f} variants/s), "
+          f"listed in {os.path.join(sweep.outputFolder, manifestName)}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__.strip().splitlines()[2])
+        sys.exit(1)
+    main(sys.argv[1], *map(int, sys.argv[2:3]))
@@ -0,0 +1,140 @@
+"""
+Reading of the robots positions recorded during an experiment, to score it offline
+"""
+import itertools
+import os
+
+import numpy as np
+
+from src.models.objectiveUtils.numpyEvaluator import evaluateTrajectory, getLightPositions
+from src.util import ResourceLoader, contentHash, replaceFile
+
+
+class TrajectoryLog:
+    """
+    Positions (in m) of the robots after each tick of an experiment, as a memory mapped array of shape (T, N, 2) : the
+    log is never loaded in memory at once, only the pages of the ticks being read.
+
+    The log is either a .npy file of that shape, a raw binary file of (x, y) positions (of the given dtype, with the
+    robots of a tick after each other), or a CSV file of "tick,robot,x,y" rows (with an optional header). The robots
+    are numbered from 0, and a robot missing from a tick has NaN coordinates. A CSV log is converted on the first read
+    to a .npy cache file, keyed by the path, size and modification time of the log (and converted again on each read
+without the cache, into the same file, so that no file is written next to the log).
+    """
+    cachePrefix = "trajectory_"
+    chunkLines = 1 << 18  # CSV lines parsed at once
+
+    def __init__(self, path, robotNumber=None, dtype=np.float32, useCache=True):
+        self.path = path
+        extension = os.path.splitext(path)[1].lower()
+
+        if extension == ".npy":
+            self.positions = np.load(path, mmap_mode="r")
+        elif extension == ".csv":
+            cachePath = self.getCachePath(path, dtype)
+            if not useCache or not os.path.exists(cachePath):
+                convertCsvLog(path, cachePath, dtype, self.chunkLines)
+            self.positions = np.load(cachePath, mmap_mode="r")
+        else:
+            if robotNumber is None:
+                raise ValueError(f"The number of robots is needed to read the binary log {path}")
+            self.positions = np.memmap(path, dtype=dtype, mode="r").reshape(-1, robotNumber, 2)
+
+        if self.positions.ndim != 3 or self.positions.shape[2] != 2:
+            raise ValueError(f"Positions of shape {self.positions.shape} in {path}, instead of (ticks, robots, 2)")
+
+    @classmethod
+    def getCachePath(cls, path, dtype):
+        """
+        Path of the .npy cache file of a CSV log. Cache files of previous versions of the log are removed, as they are
+        stale.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        pathHash = contentHash(path)[:16]
+        versionHash = contentHash(str(stat.st_size), str(stat.st_mtime_ns), np.dtype(dtype).str)[:16]
+        return ResourceLoader.getCachePath(f"{cls.cachePrefix}{pathHash}_{versionHash}.npy",
+                                           stalePrefix=f"{cls.cachePrefix}{pathHash}_")
+
+    @property
+    def ticks(self):
+        return self.positions.shape[0]
+
+    @property
+    def robotNumber(self):
+        return self.positions.shape[1]
+
+    def iterWindows(self, windowSize, start=0, stop=None):
+        """
+        Yields the positions of the ticks by windows of windowSize ticks (the last one can be smaller), as views of the
+        memory mapped log.
+        """
+        stop = self.ticks if stop is None else min(stop, self.ticks)
+        for windowStart in range(start, stop, max(1, windowSize)):
+            yield self.positions[windowStart:min(windowStart + windowSize, stop)]
+
+    def evaluate(self, objective, arena=None, chunkSize=1024, parser=None, stageTotals=None):
+        """
+        Value of the objective for the recorded experiment, in an arena (for the lights positions), evaluated by chunks
+        of ticks so that only chunkSize ticks are in memory at once. See evaluateTrajectory for the stageTotals.
+        """
+        lights = None if arena is None else getLightPositions(arena)
+        return evaluateTrajectory(objective, self.positions, lights, chunkSize, parser, stageTotals)
+
+    def inSpawn(self, arena, tick=0):
+        """
+        Whether each robot is inside the spawn area of the arena at the given tick.
+        """
+        positions = np.asarray(self.positions[tick], dtype=float) / arena.getCoordScale()
+        return arena.spawn.contains(positions[:, 0], positions[:, 1])
+
+
+def readCsvChunks(path, chunkLines):
+    """
+    Yields the rows of a "tick,robot,x,y" CSV file by arrays of at most chunkLines rows. A first line that is not
+    numeric is taken as a header.
+    """
+    with open(path) as file:
+        firstLine = file.readline()
+        lines = [] if not firstLine or isHeader(firstLine) else [firstLine]
+        while True:
+            lines.extend(itertools.islice(file, chunkLines - len(lines)))
+            lines = [line for line in lines if line.strip()]
+            if not lines:
+                return
+            yield np.loadtxt(lines, delimiter=",", usecols=(0, 1, 2, 3), ndmin=2)
+            lines = []
+
+
+def isHeader(line):
+    try:
+        float(line.split(",")[0])
+        return False
+    except ValueError:
+        return True
+
+
+def convertCsvLog(csvPath, npyPath, dtype=np.float32, chunkLines=TrajectoryLog.chunkLines):
+    """
+    Converts a CSV log to a .npy file of shape (T, N, 2), in two streaming passes : the first one finds the ticks and
+    robots numbers, the second one writes the positions in the memory mapped file. The file is written under a
+    temporary name, so that an interrupted conversion does not leave an incomplete cache.
+    """
+    firstTick, lastTick, robotNumber = None, None, 0
+    for rows in readCsvChunks(csvPath, chunkLines):
+        ticks = rows[:, 0]
+        firstTick = ticks.min() if firstTick is None else min(firstTick, ticks.min())
+        lastTick = ticks.max() if lastTick is None else max(lastTick, ticks.max())
+        robotNumber = max(robotNumber, int(rows[:, 1].max()) + 1)
+    tickNumber = 0 if firstTick is None else int(lastTick - firstTick) + 1
+
+
+    def write(temporaryPath):
+        positions = np.lib.format.open_memmap(temporaryPath, mode="w+", dtype=dtype,
+                                              shape=(tickNumber, robotNumber, 2))
+        positions[:] = np.nan
+        for rows in readCsvChunks(csvPath, chunkLines):
+            positions[(rows[:, 0] - firstTick).astype(np.intp), rows[:, 1].astype(np.intp)] = rows[:, 2:4]
+        positions.flush()
+
+    replaceFile(npyPath, write)
@@ -1,4 +1,9 @@
+import glob
+import os
 import re
+import hashlib
+import importlib
+import shutil
 from importlib import resources
 from enum import Enum
 import uuid
@@ -12,6 +17,7 @@ class ResourceLoader:
     ui_folder = res_folder + ".ui"
     ui_extension = ".ui"
     data_folder = res_folder + ".data"
+    cache_folder = os.environ.get("SKILLWIZARD_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "skillwizard"))
 
     @classmethod
     def loadWidget(cls, name, baseinstance=None):
@@ -26,6 +32,30 @@ class ResourceLoader:
     def openData(cls, file):
         return resources.files(cls.data_folder).joinpath(file).open('r')
 
+    @classmethod
+    def readData(cls, file):
+        with cls.openData(file) as dataFile:
+            return dataFile.read()
+
+    @classmethod
+    def getCachePath(cls, file, stalePrefix=None):
+        """
+        Path of a file in the cache folder (created if needed). The folder can be set with the SKILLWIZARD_CACHE
+        environment variable. If a stale prefix is given, the other cache files starting with it (and of the same
+        extension) are removed, as they are stale versions of the file.
+        """
+        os.makedirs(cls.cache_folder, exist_ok=True)
+        path = os.path.join(cls.cache_folder, file)
+        if stalePrefix is not None:
+            pattern = glob.escape(os.path.join(cls.cache_folder, stalePrefix)) + "*" + os.path.splitext(file)[1]
+            for stalePath in glob.glob(pattern):
+                if stalePath != path:
+                    try:
+                        os.remove(stalePath)
+                    except OSError:
+                        pass
+        return path
+
 
 class Event:
     def __init__(self):
@@ -131,6 +161,65 @@ def cleanIdentifier(name):
     return name
 
 
+def contentHash(*contents):
+    """
+    Hex digest identifying the given contents (strings or bytes), in order.
+    """
+    digest = hashlib.sha256()
+    for content in contents:
+        if isinstance(content, str):
+            content = content.encode()
+        digest.update(content)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def moduleHash(*names):
+    """
+    Hex digest identifying the sources of the given modules (by name), to key what they generate.
+    """
+    sources = []
+    for name in names:
+        with open(importlib.import_module(name).__file__, 'rb') as file:
+            sources.append(file.read())
+    return contentHash(*sources)
+
+
+fingerprintPattern = re.compile(r"Fingerprint ([0-9a-f]{64})")
+
+
+def readFingerprint(path, headerLines=5):
+    """
+    Fingerprint ("Fingerprint <contentHash>") written in the first lines of a generated file, or None if the file does
+    not exist or has none.
+    """
+    try:
+        with open(path, 'r') as file:
+            for _ in range(headerLines):
+                match = fingerprintPattern.search(file.readline())
+                if match:
+                    return match.group(1)
+    except (OSError, UnicodeDecodeError):
+        pass
+    return None
+
+
+def replaceFile(path, write):
+    """
+    Writes a file (or folder) with write(temporaryPath) under a temporary name then renames it to the path, so that it
+    is never read incomplete, even when several processes write it at once.
+    """
+    temporaryPath = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(temporaryPath)
+        os.replace(temporaryPath, path)
+    finally:
+        if os.path.isdir(temporaryPath):
+            shutil.rmtree(temporaryPath)
+        elif os.path.exists(temporaryPath):
+            os.remove(temporaryPath)
+
+
 def containsAny(container, *args):
     return any(element in container for element in args)
 
@@ -34,6 +34,8 @@ class ObjectiveView(QGroupBox):
         self.settingsTab.EditObjectiveButton.clicked.connect(self.onEditObjective)
         self.settingsTab.GenerateLoopFunctionsButton.clicked.connect(self.onGenerateLoopFunctions)
         self.settingsTab.ObjectiveName.editingFinished.connect(self.onObjectiveNameChanged)
+        self.settingsTab.EvaluationPeriod.valueChanged.connect(self.onEvaluationPeriodChanged)
+        self.settingsTab.RescaleEvaluation.toggled.connect(self.onRescaleEvaluationChanged)
 
     def getCenterWidget(self):
         return self
@@ -44,7 +46,11 @@ class ObjectiveView(QGroupBox):
         """
         self.updatePostStepFunction(objective.postStepStages)
         self.updatePostExpFunction(objective.postExpStages)
+        self.blockSignal = True
         self.settingsTab.ObjectiveName.setText(objective.name)
+        self.settingsTab.EvaluationPeriod.setValue(objective.evaluationPeriod)
+        self.settingsTab.RescaleEvaluation.setChecked(objective.rescaleEvaluation)
+        self.blockSignal = False
 
     # ---------- Events ------------
 
@@ -72,6 +78,22 @@ class ObjectiveView(QGroupBox):
             return
         self.onObjectiveSettingsChanged(name=self.settingsTab.ObjectiveName.text())
 
+    def onEvaluationPeriodChanged(self, value):
+        """
+        Called when the number of ticks between two evaluations of the objective has been changed
+        """
+        if self.blockSignal:
+            return
+        self.onObjectiveSettingsChanged(evaluationPeriod=value)
+
+    def onRescaleEvaluationChanged(self, checked):
+        """
+        Called when the rescaling of the evaluations has been toggled
+        """
+        if self.blockSignal:
+            return
+        self.onObjectiveSettingsChanged(rescaleEvaluation=checked)
+
     # ----------------------
 
     def addToLayout(self, widget, parent):
@@ -92,6 +114,12 @@ class ObjectiveView(QGroupBox):
         """
         self.PostExpFunction.setText(self.getFunctionFromStages(stages, "objective"))
 
+    def updatePostStepCost(self, report):
+        """
+        Sets the estimated cost of the Post Step stages. See costEstimator.formatCostReport
+        """
+        self.PostStepCost.setText(report)
+
     def getFunctionFromStages(self, stages, default=""):
         """
         Creates the text of the function expression from the list of stages.
@@ -0,0 +1,19 @@
+import tempfile
+
+from src.util import ResourceLoader
+
+
+class TemporaryCacheFolder:
+    """
+    Points the cache folder at a temporary folder between start and stop, so that the tests do not write to the user
+    cache folder.
+    """
+    def start(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.previousFolder = ResourceLoader.cache_folder
+        ResourceLoader.cache_folder = self.folder.name
+        return self.folder.name
+
+    def stop(self):
+        ResourceLoader.cache_folder = self.previousFolder
+        self.folder.cleanup()
@@ -0,0 +1,128 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from src.models.arena import Arena
+from src.models.objective import Objective
+from src.models.objectiveUtils.loopFunctions import generateFunctionCode, generateInitCode, generateLoopFunctions, \
+    generatePostStepCode, getLoopFunctionsKey, getRequiredFunctions
+from src.models.objectiveUtils.stage import Stage
+from src.models.objectiveUtils.stageParser import getStageParser, CompilationContext
+from tests import TemporaryCacheFolder
+
+substitutions = {"objective_name": "Test", "parallel_threshold": 128}
+
+cacheFolder = TemporaryCacheFolder()  # for the parser tables
+setUpModule = cacheFolder.start
+tearDownModule = cacheFolder.stop
+
+
+class GenerateFunctionCodeTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.data = CompilationContext(getStageParser()).getFunctionData()
+
+    def getEmitted(self, functions):
+        """
+        Names of the model functions whose declaration is emitted for the given functions.
+        """
+        declarations, _ = generateFunctionCode(functions, self.data, substitutions)
+        return {function["name"] for function in self.data
+                if function["declaration"] and function["declaration"] in declarations}
+
+    def testSum(self):
+        self.assertEqual(getRequiredFunctions({"sum"}, self.data), {"sum"})
+        self.assertEqual(self.getEmitted({"sum"}), {"sum"})
+
+    def testDistNN(self):
+        self.assertEqual(getRequiredFunctions({"dist N-N"}, self.data), {"dist N-N", "dist 1-1"})
+        self.assertEqual(self.getEmitted({"dist N-N"}), {"dist N-N", "dist 1-1"})
+
+    def testNoFunction(self):
+        declarations, definitions = generateFunctionCode(set(), self.data, substitutions)
+        self.assertEqual(declarations.strip(), "/********* Generated Functions **********/")
+        self.assertEqual(definitions.strip(), "/********* Generated Functions **********/")
+
+
+class GenerateLoopFunctionsTest(unittest.TestCase):
+    def testSumObjective(self):
+        # the product keeps Sum and Dist from being fused
+        objective = Objective({
+            "name": "SumOnly",
+            "postStepStages": [{"name": "total", "code": "Sum(Dist(robotsPos, robotsPos) * 2)"}],
+        })
+        mission = SimpleNamespace(objective=objective, arena=Arena())
+        data = CompilationContext(getStageParser()).getFunctionData()
+
+        with tempfile.TemporaryDirectory() as folder:
+            generateLoopFunctions(mission, os.path.join(folder, "SumOnlyLoopFunc.cpp"))
+            with open(os.path.join(folder, "SumOnlyLoopFunc.h")) as file:
+                header = file.read()
+
+        emitted = {function["name"] for function in data
+                   if function["declaration"] and function["declaration"] in header}
+        self.assertEqual(emitted, {"sum", "dist N-N", "dist 1-1"})
+
+
+class InvariantHoistingTest(unittest.TestCase):
+    def generate(self, *codes):
+        """
+        Post step code of stages of the given codes, then the Init code and the members it declares.
+        """
+        context = CompilationContext(getStageParser())
+        stages = [Stage({"name": f"stage{i}", "code": code}) for i, code in enumerate(codes)]
+        postStep = generatePostStepCode(stages, context)
+        init, members = generateInitCode([], context)
+        return postStep, init, members
+
+    def testInvariantCall(self):
+        postStep, init, members = self.generate('Mean(Dist(robotsPos, LightPos("light_0")))',
+                                                'Max(Dist(robotsPos, LightPos("light_0")))')
+        self.assertNotIn("LightPos", postStep)
+        self.assertEqual(postStep.count("m_InvariantVar_1"), 2)
+        self.assertIn('  CVector2 tempVar_1 = LightPos("light_0");\n  m_InvariantVar_1 = tempVar_1;\n', init)
+        self.assertEqual(members, "    CVector2 m_InvariantVar_1;\n")
+
+    def testLargestSubtree(self):
+        # the distance between the lights is hoisted at once, not each light
+        postStep, init, members = self.generate('Dist(LightPos("light_0"), LightPos("light_1")) * 2')
+        self.assertIn("(m_InvariantVar_1 * 2)", postStep)
+        self.assertNotIn("Dist(", postStep)
+        self.assertIn("  m_InvariantVar_1 = tempVar_3;\n", init)
+        self.assertIn("Real tempVar_3 = Dist(tempVar_1, tempVar_2);", init)
+        self.assertEqual(members, "    Real m_InvariantVar_1;\n")
+
+    def testRobotDependentCalls(self):
+        postStep, init, members = self.generate("Sum(Dist(robotsPos, robotsPos) * 2)", "CountWithin(robotsPos, 0.3)")
+        self.assertNotIn("m_InvariantVar", postStep)
+        self.assertIn("Dist(robotsPos, robotsPos, tempVar_1);", postStep)
+        self.assertIn("CountWithin(robotsPos, 0.3)", postStep)
+        self.assertEqual((init, members), ("", ""))
+
+    def testImpureCall(self):
+        # the Update stays in the post step, only its invariant argument is hoisted
+        postStep, init, members = self.generate('Update(target, LightPos("light_0"))')
+        self.assertIn("Update(target, m_InvariantVar_1);", postStep)
+        self.assertNotIn("Update", init)
+        self.assertEqual(members, "    CVector2 m_InvariantVar_1;\n")
+
+
+class LoopFunctionsKeyTest(unittest.TestCase):
+    def getKey(self, code, **arena):
+        objective = Objective({"name": "Key", "postStepStages": [{"name": "value", "code": code}]})
+        return getLoopFunctionsKey(SimpleNamespace(objective=objective, arena=Arena(arena)))
+
+    def testRobotNumber(self):
+        # the spatial grid is sized at runtime, so the robots number does not change the code
+        for code in ("Sum(Dist(robotsPos, robotsPos) * 2)", "CountWithin(robotsPos, 0.3)"):
+            self.assertEqual(self.getKey(code, robotNumber=5), self.getKey(code, robotNumber=10))
+
+    def testInputs(self):
+        code = "CountWithin(robotsPos, 0.3)"
+        self.assertNotEqual(self.getKey(code), self.getKey("CountWithin(robotsPos, 0.4)"))
+        self.assertNotEqual(self.getKey(code), self.getKey(code, spawn={"x": 10}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import math
+import statistics
+import unittest
+
+import numpy as np
+
+from src.models.objective import Objective
+from src.models.objectiveUtils.numpyEvaluator import NumpyEvaluator, UnsupportedFunctionError, checkSupported, \
+    evaluateObjective, evaluateTrajectory
+from src.models.objectiveUtils.stageParser import getStageParser
+from tests import TemporaryCacheFolder
+
+cacheFolder = TemporaryCacheFolder()  # for the parser tables
+setUpModule = cacheFolder.start
+tearDownModule = cacheFolder.stop
+
+lights = {"light_0": (0.5, -0.25)}
+
+
+def closestDistances(positions):
+    """
+    Distance of each position to its closest other position, by brute force.
+    """
+    return [min(math.dist(p, q) for j, q in enumerate(positions) if j != i) for i, p in enumerate(positions)]
+
+
+def countWithin(positions, radius):
+    return sum(math.dist(positions[i], positions[j]) <= radius
+               for i in range(len(positions)) for j in range(i + 1, len(positions)))
+
+
+# post step stage codes, with their value for the positions of a tick computed without NumPy
+references = {
+    'Sum(Dist(robotsPos, LightPos("light_0")))':
+        lambda positions: sum(math.dist(p, lights["light_0"]) for p in positions),
+    'Mean(Dist(robotsPos, LightPos("light_0"))) * 2':
+        lambda positions: 2 * sum(math.dist(p, lights["light_0"]) for p in positions) / len(positions),
+    "Variance(Dist(robotsPos, ClosestNeighbors(robotsPos)))":
+        lambda positions: statistics.pvariance(closestDistances(positions)),
+    "Min(Dist(robotsPos, ClosestNeighbors(robotsPos)))": lambda positions: min(closestDistances(positions)),
+    "CountWithin(robotsPos, 0.3)": lambda positions: countWithin(positions, 0.3),
+    "Sum(NeighborsWithin(robotsPos, 0.3))": lambda positions: 2 * countWithin(positions, 0.3),
+}
+
+
+class EvaluatorTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.trajectory = np.random.default_rng(0).uniform(-1, 1, (25, 12, 2))
+
+    def getReference(self, code, period=1, rescale=False):
+        ticks = self.trajectory[period - 1::period]
+        return (period if rescale else 1) * sum(references[code](positions.tolist()) for positions in ticks)
+
+    def assertEvaluations(self, objective, expected):
+        self.assertAlmostEqual(evaluateObjective(objective, self.trajectory, lights), expected)
+        self.assertAlmostEqual(evaluateTrajectory(objective, self.trajectory, lights), expected)
+        for chunkSize in (1, 4, 100):
+            self.assertAlmostEqual(evaluateTrajectory(objective, self.trajectory, lights, chunkSize), expected)
+
+    def testFunctions(self):
+        for code in references:
+            with self.subTest(code=code):
+                objective = Objective({"postStepStages": [{"name": "value", "code": code}]})
+                self.assertEvaluations(objective, self.getReference(code))
+
+    def testPeriod(self):
+        code = "CountWithin(robotsPos, 0.3)"
+        objective = Objective({"evaluationPeriod": 3, "rescaleEvaluation": True,
+                               "postStepStages": [{"name": "value", "code": code}]})
+        self.assertEvaluations(objective, self.getReference(code, 3, True))
+
+    def testStageTotals(self):
+        codes = list(references)[:2]
+        objective = Objective({"postStepStages": [{"name": "first", "code": codes[0]},
+                                                  {"name": "second", "code": codes[1], "increment": False}]})
+        perTick, batched = {}, {}
+        value = evaluateObjective(objective, self.trajectory, lights, stageTotals=perTick)
+        self.assertAlmostEqual(evaluateTrajectory(objective, self.trajectory, lights, 4, stageTotals=batched), value)
+        self.assertAlmostEqual(value, self.getReference(codes[0]))
+        for name, code in (("first", codes[0]), ("second", codes[1])):
+            self.assertAlmostEqual(perTick[name], self.getReference(code))
+            self.assertAlmostEqual(batched[name], self.getReference(code))
+
+    def testDependentTicks(self):
+        # reading the objective makes each tick depend on the previous ones
+        objective = Objective({"postStepStages": [{"name": "value", "code": "objective + 1"}]})
+        self.assertEvaluations(objective, 2 ** len(self.trajectory) - 1)
+
+    def testUnsupportedFunction(self):
+        objective = Objective({"postStepStages": [{"name": "value", "code": "CountWithin(robotsPos, 0.3)"}]})
+        evaluator = NumpyEvaluator(lights)
+        del evaluator.implementations["count within"]
+        with self.assertRaises(UnsupportedFunctionError):
+            checkSupported(objective, evaluator, getStageParser())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import unittest
+
+from src.models.objectiveUtils.stageParser import getStageParser, StageParser, CppGenerator
+from tests import TemporaryCacheFolder
+
+cacheFolder = TemporaryCacheFolder()  # for the parser tables
+setUpModule = cacheFolder.start
+tearDownModule = cacheFolder.stop
+
+
+def generateInstruction(parser, code):
+    """
+    Instruction emitted for the value of a post step stage.
+    """
+    node = parser.parseStage(code, "postStep")
+    return CppGenerator(parser.getTypes(), parser.getListTypes()).generate(node)[1]
+
+
+class ConstantFolderTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.parser = getStageParser()
+        cls.unoptimizedParser = StageParser("objective_model.json", "objective_grammar.lark", optimize=False)
+
+    def assertFolded(self, code, expected):
+        instruction = generateInstruction(self.parser, code)
+        self.assertEqual(instruction, expected)
+        self.assertLess(len(instruction), len(generateInstruction(self.unoptimizedParser, code)))
+
+    def testConstants(self):
+        self.assertFolded("(2 * 3.5) / 10", "0.7")
+
+    def testIdentities(self):
+        self.assertFolded("objective * 1", "objective")
+        self.assertFolded("1 * objective", "objective")
+        self.assertFolded("objective + 0", "objective")
+        self.assertFolded("0 + objective", "objective")
+        self.assertFolded("objective / 1", "objective")
+
+    def testNegations(self):
+        self.assertFolded("- -objective", "objective")
+        self.assertFolded("objective * -1", "-objective")
+
+    def testDivisionByZero(self):
+        self.assertEqual(generateInstruction(self.parser, "objective / 0"), "(objective / 0)")
+        self.assertEqual(generateInstruction(self.parser, "1 / 0"), "(1 / 0)")
+
+    def testUnoptimizedNegation(self):
+        self.assertEqual(generateInstruction(self.unoptimizedParser, "- -objective"), "-(-objective)")
+
+    def testCacheOptimization(self):
+        # the stage cache is shared by the parsers, but not between optimized and unoptimized trees
+        code = "(2 * 3.5) / 10 + objective * 0"
+        self.assertEqual(generateInstruction(self.parser, code), "(0.7 + (objective * 0))")
+        self.assertEqual(generateInstruction(self.unoptimizedParser, code), "(((2 * 3.5) / 10) + (objective * 0))")
+
+
+class CommonSubexpressionTest(unittest.TestCase):
+    # target is a user defined variable, typed Pos
+    code = "Mean(Dist(robotsPos, target))"
+
+    def setUp(self):
+        self.parser = getStageParser()
+        self.generator = CppGenerator(self.parser.getTypes(), self.parser.getListTypes())
+        self.first = self.generate(self.code)
+
+    def generate(self, code):
+        return self.generator.generate(self.parser.parseStage(code, "postStep"))
+
+    def assign(self, code, target):
+        return self.generator.generateAssignment(self.parser.parseStage(code, "postStep"), target)
+
+    def assertReused(self):
+        self.assertEqual(self.generate(self.code), ("", self.first[1]))
+
+    def assertRecomputed(self):
+        code, instruction = self.generate(self.code)
+        self.assertNotEqual(instruction, self.first[1])
+        self.assertEqual(code, self.first[0].replace(self.first[1], instruction))
+
+    def testReuse(self):
+        self.assertEqual(self.generate(f"{self.code} * 2"), ("", f"({self.first[1]} * 2)"))
+        self.assertReused()
+
+    def testAssignment(self):
+        self.assign("CountWithin(robotsPos, objective)", "other")
+        self.assertReused()
+        self.assign('LightPos("light_0")', "target")
+        self.assertRecomputed()
+
+    def testUpdate(self):
+        self.generate('Update(target, LightPos("light_0"))')
+        self.assertRecomputed()
+
+    def testImpureCall(self):
+        # an impure call may modify any variable, not only its operands
+        self.generate('Update(other, LightPos("light_0"))')
+        self.assertRecomputed()
+
+
+class ParserCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cacheFolder = TemporaryCacheFolder()
+        self.cacheFolder.start()
+
+    def tearDown(self):
+        self.cacheFolder.stop()
+
+    def createCacheFile(self, functionPath, grammarPath, sourceHash):
+        path = StageParser.getCachePath(functionPath, grammarPath, sourceHash)
+        open(path, 'w').close()
+        return path
+
+    def testStaleCache(self):
+        stalePath = self.createCacheFile("model.json", "grammar.lark", "old")
+        path = self.createCacheFile("model.json", "grammar.lark", "new")
+        self.assertFalse(os.path.exists(stalePath))
+        self.assertTrue(os.path.exists(path))
+
+    def testOtherFilesCache(self):
+        # parsers of other model or grammar files keep their cache
+        paths = [self.createCacheFile("model.json", "grammar.lark", "source"),
+                 self.createCacheFile("otherModel.json", "grammar.lark", "source"),
+                 self.createCacheFile("model.json", "otherGrammar.lark", "source")]
+        self.createCacheFile("model.json", "grammar.lark", "source")
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+        self.assertEqual(len(set(paths)), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
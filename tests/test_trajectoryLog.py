@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from src.models.trajectoryLog import TrajectoryLog
+from tests import TemporaryCacheFolder
+
+
+class TrajectoryLogCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cacheFolder = TemporaryCacheFolder()
+        self.cacheFolderName = self.cacheFolder.start()
+        self.logFolder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.logFolder.name, "log.csv")
+        self.writeLog("tick,robot,x,y\n0,0,1.0,2.0\n0,1,3.0,4.0\n1,0,5.0,6.0\n")
+
+    def tearDown(self):
+        self.cacheFolder.stop()
+        self.logFolder.cleanup()
+
+    def writeLog(self, content):
+        with open(self.path, 'w') as file:
+            file.write(content)
+
+    def testConversion(self):
+        log = TrajectoryLog(self.path)
+        self.assertEqual(log.positions.shape, (2, 2, 2))
+        np.testing.assert_array_equal(log.positions[1, 0], [5, 6])
+        self.assertTrue(np.isnan(log.positions[1, 1]).all())
+
+    def testStaleCache(self):
+        stalePath = TrajectoryLog.getCachePath(self.path, np.float32)
+        TrajectoryLog(self.path)
+        self.writeLog("0,0,1.0,2.0\n")
+        os.utime(self.path, ns=(0, 0))
+        log = TrajectoryLog(self.path)
+        self.assertEqual(log.positions.shape, (1, 1, 2))
+        self.assertFalse(os.path.exists(stalePath))
+        self.assertEqual(len(os.listdir(self.cacheFolderName)), 1)
+
+    def testNoCache(self):
+        # the log is converted again, into the cache folder rather than next to the log
+        cachePath = TrajectoryLog.getCachePath(self.path, np.float32)
+        np.save(cachePath, np.zeros((1, 1, 2), dtype=np.float32))
+        log = TrajectoryLog(self.path, useCache=False)
+        np.testing.assert_array_equal(log.positions[0, 1], [3, 4])
+        self.assertEqual(os.listdir(self.logFolder.name), ["log.csv"])
+
+
+if __name__ == "__main__":
+    unittest.main()